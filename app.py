@@ -1,40 +1,89 @@
-from networkx import reverse
-from flask import Flask, render_template, abort, request, session, redirect, url_for, flash
+import time
+_import_started = time.perf_counter()
+from flask import Flask, render_template, abort, request, session, redirect, url_for, flash, jsonify, make_response, Response, stream_with_context
 from dotenv import load_dotenv
 from database import Database 
 from werkzeug.utils import secure_filename 
-import uuid
-import firebase_admin
-from firebase_admin import credentials, auth
 import os
 import json
-from geminiCardOutput import get_recommended_card
-import pandas as pd
+import base64
+import threading
 from datetime import datetime
-from collections import defaultdict
-from gemini_analysis import get_spending_recommendations
+from cachetools import LRUCache
+from ingest import MAX_UPLOAD_BYTES, UploadTooLarge, ingest_csv
+from jobs import JobQueue
+from http_caching import build_version, init_http_caching, is_not_modified, not_modified_response, set_validators
+from fragments import render_fragment
+from response_cache import make_key
+from token_verifier import TokenVerifier
+from rewards import rollup_spend
+from categorizer import Categorizer, normalize_description
+from simulator import DASHBOARD_CARDS, card_matrix
 
 
 
-app = Flask(__name__)
+# The secret key is set at import, since sessions are opened before any
+# before_request hook could set it (see ensure_started).
 load_dotenv()
+app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY")
-firebase_service_account_json = os.environ.get('FIREBASE_SERVICE_ACCOUNT_JSON')
-if not firebase_service_account_json:
-    raise Exception("FIREBASE_SERVICE_ACCOUNT_JSON not found in env!")
-
-firebase_creds_dict = json.loads(firebase_service_account_json)
-cred = credentials.Certificate(firebase_creds_dict)
-firebase_app = firebase_admin.initialize_app(cred)
+init_http_caching(app)
+app.jinja_env.globals["render_fragment"] = render_fragment
 
 db = None
+jobs = None
+token_verifier = None
+_started = False
+_start_lock = threading.Lock()
+# IDs of users already stored, so repeat logins skip the database write.
+known_users = LRUCache(maxsize=10000)
+
+
+def create_app():
+    '''
+    Configures the app and starts its services, then returns it.
+
+    This is the entry point for gunicorn ("app:create_app()"): importing this
+    module only defines the routes. pandas and the Gemini clients are
+    imported the first time they are needed, not here. How long startup
+    took is recorded in app.config["STARTUP_SECONDS"] and reported by /health.
+    '''
+    global _started
+    with _start_lock:
+        if _started:
+            return app
+        _start_services()
+        _started = True
+    return app
+
+def _start_services():
+    global db, jobs, token_verifier
+    started = time.perf_counter()
+    firebase_service_account_json = os.environ.get('FIREBASE_SERVICE_ACCOUNT_JSON')
+    if not firebase_service_account_json:
+        raise Exception("FIREBASE_SERVICE_ACCOUNT_JSON not found in env!")
+    project_id = os.getenv("FIREBASE_PROJECT_ID") or json.loads(firebase_service_account_json)["project_id"]
 
-
-def init_app():
-    '''Runs once at the start to initialize the app with any necessary configurations.'''
-    global db
     db = Database()
-init_app()
+    db.start_catalog_refresh()
+    jobs = JobQueue(db)
+    token_verifier = TokenVerifier(project_id, db)
+    app.config["STARTUP_SECONDS"] = {
+        "import": IMPORT_SECONDS,
+        "create_app": time.perf_counter() - started,
+    }
+    print(f"App started in {IMPORT_SECONDS + app.config['STARTUP_SECONDS']['create_app']:.3f}s")
+
+@app.before_request
+def ensure_started():
+    '''Starts the app's services if it is served without create_app(), e.g. by "flask --app app run".'''
+    if not _started:
+        create_app()
+
+@app.route("/health")
+def health():
+    '''Reports that the app is up and how long it took to start, for deploy checks.'''
+    return jsonify(status="ok", startup_seconds=app.config["STARTUP_SECONDS"])
 
 @app.errorhandler(404)
 def page_not_found(e):
@@ -44,15 +93,12 @@ def page_not_found(e):
 @app.route("/")
 @app.route("/login", methods=["GET", "POST"])
 def login():
-    global db
-    if db is None:
-        db = Database()
     if request.method == "POST":
         data = request.get_json()
         id_token = data.get("idToken")
         try:
-            # Verify the ID token
-            decoded_token = auth.verify_id_token(id_token)
+            # Verify the ID token (locally, against Google's cached certificates)
+            decoded_token = token_verifier.verify(id_token)
             uid = decoded_token["uid"]
             email = decoded_token.get("email")
 
@@ -62,8 +108,11 @@ def login():
                 "id": uid,
                 "email": email,
             }
-            db.add_user(uid, email)
-            print("User added!")
+            if uid not in known_users:
+                if db.get_user(id=uid) is None:
+                    db.add_user(uid, email)
+                    print("User added!")
+                known_users[uid] = True
         except Exception as e:
             print(f"Login failed: {e}")
     return render_template("login.html", require_auth=False)
@@ -122,52 +171,60 @@ def profile():
 
 @app.route("/dashboard", methods=["GET", "POST"])
 def dashboard():
-    global db
-    if not db:
-        db = Database()
-    data = session.get("data", [])
-    categorized_totals = defaultdict(float)
-    net_balance = 0.0
-    
+    # The dashboard shows the user's whole history across every uploaded statement.
+    # The transactions table is loaded page by page from /api/transactions;
+    # these only pick the initial sort order.
     sort_column = request.args.get("sort_column", "Date")
     sort_order = request.args.get("sort_order", "asc")
-    reversed_sort = sort_order == "desc"
-    
-    if sort_column == 'Amount' and data:
-        data.sort(key=lambda x: float(x.get("Amount", 0)), reverse=reversed_sort)
-    elif sort_column == 'Date' and data:
-        data.sort(key=lambda x: datetime.strptime(x.get("Date", "1970-01-01"), '%Y-%m-%d'), reverse=reversed_sort)
-
-    for row in data:
-        category = row.get("Category", "Uncategorized")
-        amount = float(row.get("Amount", 0))
-        categorized_totals[category] += amount
-        net_balance += amount
-
-    categories = list(categorized_totals.keys())
-    amounts = [abs(categorized_totals[cat]) for cat in categories]
-    income_total = sum(amount for cat, amount in categorized_totals.items() if amount > 0)
-    expense_total = sum(abs(amount) for cat, amount in categorized_totals.items() if amount < 0)
-    net_balance = round(net_balance, 2)
+
+    # Totals come from the pre-aggregated rollups instead of walking every row.
+    category_totals = db.get_category_totals(session["user"]["id"])
+    categories = [category for category, total, count in category_totals]
+    amounts = [abs(total) for category, total, count in category_totals]
+    income_total = round(sum(total for category, total, count in category_totals if total > 0), 2)
+    expense_total = round(sum(abs(total) for category, total, count in category_totals if total < 0), 2)
+    net_balance = round(sum(total for category, total, count in category_totals), 2)
+    transaction_count = sum(count for category, total, count in category_totals)
+    # Read the data version before the cards, so a change in between can
+    # only make the cached cards section re-render, never go stale.
+    data_version = db.get_data_version(session["user"]["id"])
     user_cards = db.get_user_cards(session["user"]["id"])
 
     if request.method == "POST":
-        card_id = request.form.get('cardId')
-        db.remove_user_card(session["user"]["id"], card_id)
+        db.remove_user_cards(session["user"]["id"], request.form.getlist('cardId'))
         return redirect(url_for('dashboard'))
 
+    # Every card in the catalog, ranked against the user's own spending.
+    what_if = None
+    if transaction_count:
+        spend, months = rollup_spend(db.get_monthly_totals(session["user"]["id"]))
+        what_if = card_matrix(db.catalog).rank(
+            spend, months, limit=DASHBOARD_CARDS, owned={card["cardId"] for card in user_cards}
+        )
+
     # --- NEW LOGIC: Handle the Gemini analysis request ---
+    # The analysis runs as a background job; the page polls /jobs/<id> for the result.
     analysis_result = None
+    analysis_job = request.args.get('job')
     if request.args.get('action') == 'analyze':
-        if not data or not user_cards:
+        if not transaction_count or not user_cards:
             flash("Please upload a statement and add your cards before analyzing.", "warning")
         else:
-            # Call the new function with the user's data
-            analysis_result = get_spending_recommendations(user_cards, data)
+            # Call the new function with a compact summary of the user's spending
+            from gemini_analysis import stream_spending_recommendations
+            summary = db.get_spending_summary(session["user"]["id"])
+            job_id = jobs.submit(session["user"]["id"], "analysis", stream_spending_recommendations, user_cards, summary)
+            return redirect(url_for('dashboard', job=job_id))
+    elif analysis_job:
+        job = jobs.get(analysis_job, session["user"]["id"])
+        if job is None:
+            analysis_job = None
+        elif job["status"] == "done":
+            analysis_result = job["result"]
+            analysis_job = None
     
     return render_template(
         "dashboard.html", 
-        data=data, 
         categories=categories, 
         amounts=amounts, 
         sort_column=sort_column, 
@@ -175,56 +232,209 @@ def dashboard():
         net_balance=net_balance, 
         total_income=income_total, 
         total_expenses=expense_total, 
+        transaction_count=transaction_count,
         cards=user_cards,
-        analysis=analysis_result  # Pass the analysis result to the template
+        cards_version=(session["user"]["id"], data_version, db.catalog.version),
+        what_if=what_if,
+        analysis=analysis_result,  # Pass the analysis result to the template
+        analysis_job=analysis_job
+    )
+def encode_cursor(cursor):
+    """Encode a (sort value, id) pagination cursor as an opaque URL-safe string."""
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+def decode_cursor(token):
+    """Decode a cursor made by encode_cursor, or abort with a 400 if it is malformed."""
+    if not token:
+        return None
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        abort(400)
+
+@app.route("/api/transactions")
+def api_transactions():
+    """
+    Returns a page of the user's transactions as JSON.
+
+    Query parameters: sort_column ('Date' or 'Amount'), sort_order ('asc' or 'desc'),
+    start and end ('YYYY-MM-DD'), category, limit (1-200) and cursor (from the previous page).
+    """
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 200)
+    rows, next_cursor = db.get_transactions_page(
+        session["user"]["id"],
+        sort_column=request.args.get("sort_column", "Date"),
+        descending=request.args.get("sort_order", "asc") == "desc",
+        start=request.args.get("start") or None,
+        end=request.args.get("end") or None,
+        category=request.args.get("category") or None,
+        limit=limit,
+        after=decode_cursor(request.args.get("cursor")),
     )
+    return jsonify(transactions=rows, next_cursor=encode_cursor(next_cursor))
+
+@app.route("/api/what_if")
+def api_what_if():
+    """
+    Ranks every catalog card by its projected yearly value for the user's spending, as JSON.
+
+    Query parameters: limit (how many cards to return; all of them by default).
+    """
+    user_id = session["user"]["id"]
+    spend, months = rollup_spend(db.get_monthly_totals(user_id))
+    limit = request.args.get("limit", type=int)
+    if limit is not None:
+        limit = max(limit, 1)
+    cards = card_matrix(db.catalog).rank(spend, months, limit=limit, owned=db.get_user_card_ids(user_id))
+    return jsonify(annual_spend=round(sum(spend.values()) * 12 / months, 2), months=months, cards=cards)
+
+# Longest category name a user may give an override.
+MAX_CATEGORY_LENGTH = 64
+
+@app.route("/api/category_overrides", methods=["GET", "POST", "DELETE"])
+def api_category_overrides():
+    """
+    Reads or changes the user's category overrides as JSON.
+
+    GET returns them as {pattern: category}. POST takes {"pattern": ..., "category": ...}:
+    transactions whose description contains the pattern's words get that
+    category, both in future uploads and, right away, in the stored history.
+    DELETE takes {"pattern": ...}; it only affects future uploads.
+    """
+    user_id = session["user"]["id"]
+    recategorized = 0
+    if request.method != "GET":
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get("pattern"), str):
+            abort(400)
+        pattern = normalize_description(data["pattern"])
+        if not pattern:
+            return jsonify(error="The pattern must contain at least one word."), 400
+        if request.method == "DELETE":
+            db.remove_category_override(user_id, pattern)
+        else:
+            category = data.get("category")
+            if not isinstance(category, str) or not category.strip() or len(category.strip()) > MAX_CATEGORY_LENGTH:
+                return jsonify(error=f"The category must be 1 to {MAX_CATEGORY_LENGTH} characters."), 400
+            db.set_category_override(user_id, pattern, category.strip())
+            categorizer = Categorizer(db.get_category_overrides(user_id))
+            recategorized = db.recategorize_transactions(user_id, categorizer.override)
+    return jsonify(overrides=db.get_category_overrides(user_id), recategorized=recategorized)
+
+def card_id_list(data, field):
+    """Read a list of card IDs from a JSON request body, or abort with a 400."""
+    card_ids = data.get(field, [])
+    if not isinstance(card_ids, list) or not all(isinstance(card_id, str) for card_id in card_ids):
+        abort(400)
+    return card_ids
+
+@app.route("/api/user_cards", methods=["GET", "POST", "PUT"])
+def api_user_cards():
+    """
+    Reads or changes the user's cards as JSON, several at a time.
+
+    GET returns the user's card IDs. POST takes {"add": [...], "remove": [...]}
+    and PUT takes {"cards": [...]} to replace the whole set; either way the
+    change is made in one transaction. Unknown card IDs are rejected with a
+    400 that lists them, and nothing is changed.
+    """
+    user_id = session["user"]["id"]
+    if request.method != "GET":
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            abort(400)
+        if request.method == "PUT":
+            add, remove = card_id_list(data, "cards"), []
+        else:
+            add, remove = card_id_list(data, "add"), card_id_list(data, "remove")
+        catalog = db.catalog
+        unknown = [card_id for card_id in add if catalog.get_by_id(card_id) is None]
+        if unknown:
+            return jsonify(error="Unknown card IDs.", unknown=unknown), 400
+        if request.method == "PUT":
+            changed = db.replace_user_cards(user_id, add)
+        else:
+            changed = db.update_user_cards(user_id, add=add, remove=remove)
+    else:
+        changed = False
+    return jsonify(cards=db.get_user_card_ids(user_id), changed=changed)
+
+# Cards per page on the browse page.
+BROWSE_PAGE_SIZE = 24
+
 @app.route("/browse_cards", methods=["GET", "POST"])
 def browse_cards():
     if request.method == "POST":
-        # This part handles ADDING a card
-        card_id = request.form.get('cardId')
+        # This part handles ADDING cards (one per cardId field)
         user_id = session["user"]["id"]
-        db.add_user_card(user_id, card_id)
+        db.add_user_cards(user_id, request.form.getlist('cardId'))
         
         # Redirect to prevent form resubmission on page refresh
-        # We include the search query to keep the filter active
-        search_query = request.args.get('q', '')
-        return redirect(url_for('browse_cards', q=search_query))
+        # We include the search query and filters to keep them active
+        return redirect(url_for('browse_cards', **request.args))
 
     # This part handles DISPLAYING the cards (GET request)
-    search_query = request.args.get('q', '').lower()
-    all_cards = db.get_cards()
-    
-    if search_query:
-        # Filter the cards if a search query exists
-        filtered_cards = [
-            card for card in all_cards
-            if search_query in card['name'].lower() or search_query in card['issuer'].lower()
-        ]
-    else:
-        filtered_cards = all_cards
-
-    return render_template(
+    # The page only depends on the catalog, the templates and static files,
+    # and the query string, so browsers that already have it get a 304
+    # without the page being rendered again.
+    catalog = db.catalog
+    build, build_time = build_version(app)
+    etag = make_key(catalog.version, build, request.query_string.decode())
+    last_modified = max(catalog.updated_at or 0, build_time) or None
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    # Searching and filtering use the catalog's prebuilt index.
+    search_query = request.args.get('q', '')
+    filters = {
+        "issuer": request.args.get("issuer") or None,
+        "network": request.args.get("network") or None,
+        "currency": request.args.get("currency") or None,
+        "min_fee": request.args.get("min_fee", type=int),
+        "max_fee": request.args.get("max_fee", type=int),
+        "is_business": {"1": True, "0": False}.get(request.args.get("business")),
+    }
+    page = max(request.args.get("page", 1, type=int), 1)
+    cards, total = catalog.search_index.search(search_query, filters, page=page, per_page=BROWSE_PAGE_SIZE)
+    page_count = max((total + BROWSE_PAGE_SIZE - 1) // BROWSE_PAGE_SIZE, 1)
+
+    return set_validators(make_response(render_template(
         "browse_cards.html",
-        cards=filtered_cards,
-        search_query=search_query
-    )
+        cards=cards,
+        search_query=search_query,
+        filters=request.args,
+        issuers=sorted(issuer for issuer in catalog.by_issuer if issuer),
+        networks=sorted(network for network in catalog.by_network if network),
+        currencies=sorted(currency for currency in catalog.by_currency if currency),
+        catalog_version=catalog.version,
+        total=total,
+        page=page,
+        page_count=page_count
+    )), etag, last_modified)
+
+# Cards added to an account when it first reaches the upload page.
+DEFAULT_CARD_NAMES = ["Blue Business Cash", "Blue Business Plus"]
+
 @app.route("/upload_page", methods=["GET", "POST"])
 def upload_page():
-    global db
-    if db is None:
-        db = Database()
-
     id = session.get('user_id')
     if id is not None:
-        db.add_user_card(user_id=id, card_id=db.get_card_id_by_name("Blue Business Cash"))
-        db.add_user_card(user_id=id, card_id=db.get_card_id_by_name("Blue Business Plus"))
-    session.pop("data", None)  # Clear previous data if any
-    return render_template("upload_page.html", require_auth=True)
+        card_ids = [db.get_card_id_by_name(name) for name in DEFAULT_CARD_NAMES]
+        db.add_user_cards(id, [card_id for card_id in card_ids if card_id])
+    statements = db.get_statements(session["user"]["id"]) if "user" in session else []
+    return render_template("upload_page.html", statements=statements, require_auth=True)
+
+# Leave some room for the multipart form overhead around the file itself.
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
 
-UPLOAD_FOLDER = 'uploads'  
-os.makedirs(UPLOAD_FOLDER, exist_ok=True) 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+@app.errorhandler(413)
+def upload_too_large(e):
+    '''Handles uploads bigger than MAX_CONTENT_LENGTH.'''
+    flash(f"File is too large. The limit is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+    return redirect(url_for('upload_page'))
 
 @app.route("/upload_statement", methods=["POST"])
 def upload_statement():
@@ -239,39 +449,144 @@ def upload_statement():
 
     if file and file.filename.endswith('.csv'):
         filename = secure_filename(file.filename) 
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"  
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(filepath)
+        user_id = session["user"]["id"]
+        statement_id = db.add_statement(user_id, filename)
 
-        #parse the CSV file and store data in session
+        def report_progress(rows, bytes_read):
+            print(f"Statement {statement_id}: {rows} rows stored ({bytes_read:,} bytes read)")
+
+        #parse the CSV straight from the upload stream in chunks and append it to the user's history
         try:
-            df = pd.read_csv(filepath)
-            session['data'] = df.to_dict(orient='records')  # Store data as a list of dictionaries
-        except Exception as e:
+            stored, duplicates = ingest_csv(file.stream, db, user_id, statement_id, progress=report_progress)
+        except (UploadTooLarge, ValueError, UnicodeDecodeError) as e:  # pandas' ParserError is a ValueError
+            db.delete_statement(user_id, statement_id)
             flash(f"Error processing file: {e}")
-        flash("File uploaded successfully!")
+            return redirect(url_for('upload_page'))
+        except Exception as e:
+            # e.g. "database is locked": drop the chunks already stored, or at
+            # least mark the statement failed so it does not stay 'processing'.
+            print(f"Statement {statement_id} failed: {e!r}")
+            try:
+                db.delete_statement(user_id, statement_id)
+            except Exception:
+                db.set_statement_status(statement_id, 'failed')
+            flash("Something went wrong while saving your file. Please try uploading it again.")
+            return redirect(url_for('upload_page'))
+        db.set_statement_status(statement_id, 'complete')
+        if duplicates:
+            flash(f"File uploaded successfully! Added {stored} new transactions and skipped {duplicates} already in your history.")
+        else:
+            flash(f"File uploaded successfully! Added {stored} new transactions.")
         return redirect(url_for('dashboard'))
     else:
         flash("Invalid file type. Please upload a CSV file.")
         return redirect(url_for('upload_page'))
 
+@app.route("/delete_statement/<int:statement_id>", methods=["POST"])
+def delete_statement(statement_id):
+    '''Removes an uploaded statement and its transactions from the user's history.'''
+    db.delete_statement(session["user"]["id"], statement_id)
+    flash("Statement removed.")
+    return redirect(url_for('upload_page'))
+
+@app.route("/upload_status/<int:statement_id>")
+def upload_status(statement_id):
+    '''Reports how far along a statement upload is.'''
+    statement = db.get_statement(session["user"]["id"], statement_id)
+    if statement is None:
+        abort(404)
+    return jsonify(status=statement["status"], rows=statement["row_count"], duplicates=statement["duplicate_count"])
+
 @app.route("/third_page")
 def third_page():
     return render_template("third_page.html", require_auth=True)
 
 @app.route("/gemini_rec", methods=["GET", "POST"])
 def gemini_rec():
-    global db
-    if db is None:
-        db = Database()
-
+    from geminiCardOutput import get_cached_recommendation, stream_recommended_card
     if request.method == "POST":
         description = request.form.get("description")
         if description:
-            output = get_recommended_card(description, db)
-            return render_template("gemini_rec.html", message=output, require_auth=True)
+            output = get_cached_recommendation(description, db)
+            if output is not None:
+                return render_template("gemini_rec.html", message=output, require_auth=True)
+            # Not cached: generate it in the background and let the page poll for it.
+            job_id = jobs.submit(session["user"]["id"], "recommendation", stream_recommended_card, description, db)
+            return redirect(url_for('gemini_rec', job=job_id))
+
+    job_id = request.args.get("job")
+    if job_id:
+        job = jobs.get(job_id, session["user"]["id"])
+        if job is None:
+            abort(404)
+        if job["status"] == "done":
+            return render_template("gemini_rec.html", message=job["result"], require_auth=True)
+        if job["status"] == "failed":
+            return render_template("gemini_rec.html", error=job["error"], require_auth=True)
+        return render_template("gemini_rec.html", job_id=job_id, require_auth=True)
     return render_template("gemini_rec.html", require_auth=True)
 
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    '''Reports the status (and, once finished, the result) of a background job.'''
+    job = jobs.get(job_id, session["user"]["id"])
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
+# How long one /events connection stays open before the browser reconnects,
+# so a slow generation does not hold a worker for its whole duration.
+EVENT_STREAM_SECONDS = 25
+
+def sse(event, data, event_id=None):
+    '''Formats one server-sent event.'''
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    '''
+    Streams a background job's output as server-sent events.
+
+    'partial' events carry new text as the model produces it, followed by a
+    single 'done' (with the final result) or 'failed' event. Each event ID is
+    the length of the text sent so far, so a reconnecting browser (which sends
+    Last-Event-ID) picks up where it left off.
+    '''
+    user_id = session["user"]["id"]
+    if jobs.get(job_id, user_id) is None:
+        abort(404)
+    sent = request.headers.get("Last-Event-ID", 0, type=int)
+
+    def generate(sent):
+        yield "retry: 1000\n\n"
+        deadline = time.monotonic() + EVENT_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            job = jobs.get(job_id, user_id)
+            if job is None:
+                # The job was purged while we were streaming it.
+                yield sse("failed", {"error": "This analysis is no longer available. Please run it again."})
+                return
+            partial = job["partial"] or ""
+            if len(partial) > sent:
+                yield sse("partial", {"text": partial[sent:]}, event_id=len(partial))
+                sent = len(partial)
+            if job["status"] == "done":
+                yield sse("done", {"result": job["result"]})
+                return
+            if job["status"] == "failed":
+                yield sse("failed", {"error": job["error"]})
+                return
+            time.sleep(0.2)
+
+    response = Response(stream_with_context(generate(sent)), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
 @app.route("/tips")
 def tips():
     return render_template("tips.html", require_auth=True)
@@ -286,5 +601,7 @@ def normalize_issuer_name(name):
     # Capitalize each word and replace underscores with spaces
     return ' '.join(word.capitalize() for word in name.split('_'))
 
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
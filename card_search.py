@@ -0,0 +1,269 @@
+import bisect
+import math
+import re
+from collections import Counter, defaultdict
+from collections.abc import Sequence
+
+# Rewards currencies grouped by what they are good for, so queries like
+# "hotel card" or "airline miles" match cards whose currency is e.g. MARRIOTT or DELTA.
+AIRLINE_CURRENCIES = {
+    "DELTA", "UNITED", "AMERICAN", "SOUTHWEST", "ALASKA", "JETBLUE", "HAWAIIAN", "SPIRIT",
+    "FRONTIER", "BREEZE", "AVIOS", "FLYING_BLUE", "AEROPLAN", "AVIANCA", "LATAM", "KOREAN",
+    "EMIRATES", "LUFTHANSA", "ANA", "CATHAY_PACIFIC", "VIRGIN",
+}
+HOTEL_CURRENCIES = {"MARRIOTT", "HILTON", "IHG", "HYATT", "WYNDHAM", "CHOICE", "BEST_WESTERN"}
+CASH_CURRENCIES = {"USD"}
+
+# Query words that mean the same thing as a tag we add to card documents.
+SYNONYMS = {
+    "airlines": "airline", "flight": "airline", "flights": "airline", "flying": "airline",
+    "miles": "airline", "mile": "airline", "fly": "airline",
+    "hotels": "hotel", "stay": "hotel", "stays": "hotel",
+    "cashback": "cash", "cash-back": "cash", "money": "cash",
+    "trip": "travel", "trips": "travel", "traveling": "travel", "travelling": "travel",
+    "amex": "american express",
+    "boa": "bank of america", "bofa": "bank of america",
+    "cap": "capital",
+}
+
+STOP_WORDS = {
+    "a", "an", "and", "the", "for", "with", "i", "me", "my", "to", "of", "on", "in", "is",
+    "that", "card", "cards", "credit", "want", "need", "looking", "like", "would", "some",
+    "good", "best", "great", "please", "who", "it", "has", "have", "any",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Split text into lower-case word tokens, treating underscores as spaces."""
+    return _WORD_RE.findall(str(text or "").lower().replace("_", " "))
+
+
+def card_tags(card):
+    """Derived words describing a card that do not appear in its raw fields."""
+    tags = []
+    currency = card.get("currency")
+    if currency in AIRLINE_CURRENCIES:
+        tags += ["airline", "travel"]
+    elif currency in HOTEL_CURRENCIES:
+        tags += ["hotel", "travel"]
+    elif currency in CASH_CURRENCIES:
+        tags.append("cash")
+    else:
+        tags += ["points", "travel"]
+    tags.append("business" if card.get("isBusiness") else "personal")
+    if not card.get("annualFee"):
+        tags.append("free")
+    return tags
+
+
+def card_document(card):
+    """All the searchable words for a card: name, issuer, network, currency, credits, offers and tags."""
+    parts = [card.get("name"), card.get("issuer"), card.get("network"), card.get("currency")]
+    for credit in card.get("credits") or []:
+        parts.append(credit.get("description"))
+    for offer in card.get("offers") or []:
+        for amount in offer.get("amount") or []:
+            parts.append(amount.get("currency"))
+        for credit in offer.get("credits") or []:
+            parts.append(credit.get("description"))
+    tokens = []
+    for part in parts:
+        tokens.extend(tokenize(part))
+    return tokens + card_tags(card)
+
+
+def query_terms(query):
+    """Tokenize a query, expanding synonyms and dropping stop words."""
+    terms = []
+    for token in tokenize(query):
+        token = SYNONYMS.get(token, token)
+        terms.extend(word for word in token.split() if word not in STOP_WORDS)
+    return terms
+
+
+def extract_filters(query):
+    """
+    Pull structured constraints out of a free-text query.
+
+    Returns:
+        dict: Any of 'max_fee' (dollars) and 'is_business' (bool).
+    """
+    text = (query or "").lower()
+    filters = {}
+    if re.search(r"\b(no|zero|without( an?)?|\$?0)\s+(annual\s+)?fee", text) or "fee-free" in text:
+        filters["max_fee"] = 0
+    else:
+        match = re.search(r"(?:under|below|less than|at most|max(?:imum)?|<=?)\s*\$?\s*(\d+)", text)
+        if match and "fee" in text:
+            filters["max_fee"] = int(match.group(1))
+    if re.search(r"\bbusiness\b", text):
+        filters["is_business"] = True
+    elif re.search(r"\b(personal|consumer)\b", text):
+        filters["is_business"] = False
+    return filters
+
+
+# Card fields that browse filters match exactly, and the query parameter for each.
+FILTER_FIELDS = {"issuer": "issuer", "network": "network", "currency": "currency"}
+# Prefix matches (e.g. 'sapph' for 'sapphire') count for this much of an exact match.
+PREFIX_WEIGHT = 0.7
+# Shortest query word that is also matched as a prefix.
+MIN_PREFIX = 2
+
+
+class CardIndex:
+    """
+    A TF-IDF inverted index over the card catalog.
+
+    Built once per catalog snapshot; searching only touches the postings for
+    the query's terms, so it scales with the query, not the catalog. The
+    fields used for filtering and ranking are copied into plain lists, so
+    only the cards actually returned are read from a mapped catalog.
+    """
+
+    def __init__(self, cards):
+        self.cards = cards if isinstance(cards, Sequence) else list(cards)
+        self.postings = defaultdict(list)  # term -> [(card index, weight)]
+        # field -> value -> set of card indexes, for the structured browse filters
+        self.fields = {field: defaultdict(set) for field in FILTER_FIELDS}
+        self.fees = []
+        self.cashback = []
+        self.business = []
+        documents = []
+        for index, card in enumerate(self.cards):
+            for field in FILTER_FIELDS:
+                self.fields[field][card.get(field)].add(index)
+            self.fees.append(card.get("annualFee") or 0)
+            self.cashback.append(card.get("universalCashbackPercent") or 0)
+            self.business.append(bool(card.get("isBusiness")))
+            documents.append(Counter(card_document(card)))
+
+        document_frequency = Counter()
+        for counts in documents:
+            document_frequency.update(counts.keys())
+
+        total = len(self.cards)
+        self.idf = {
+            term: math.log((1 + total) / (1 + frequency)) + 1
+            for term, frequency in document_frequency.items()
+        }
+        for index, counts in enumerate(documents):
+            weights = {term: (1 + math.log(count)) * self.idf[term] for term, count in counts.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self.postings[term].append((index, weight / norm))
+        # Sorted vocabulary, so prefix lookups are a binary search.
+        self.terms = sorted(self.postings)
+
+    def score(self, terms):
+        """Relevance scores for query terms, as a dict of card index -> score."""
+        scores = defaultdict(float)
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, weight in self.postings[term]:
+                scores[index] += weight * idf
+        return scores
+
+    def candidates(self, query, k=15):
+        """
+        The k cards most relevant to a free-text query.
+
+        Structured filters in the query (annual fee, business/personal) are
+        applied first; if nothing passes them, they are ignored. Ties and
+        cards that match no terms are ordered by cash-back rate, then fee.
+        """
+        filters = extract_filters(query)
+        pool = self.filter_pool(filters)
+        if not pool:
+            pool = list(range(len(self.cards)))
+
+        scores = self.score(query_terms(query))
+
+        def rank(index):
+            return (-scores.get(index, 0.0), -self.cashback[index], self.fees[index])
+
+        return [self.cards[index] for index in sorted(pool, key=rank)[:k]]
+
+    def expand(self, word):
+        """
+        The index terms a typed word matches, with a weight for each.
+
+        The word itself (after synonyms) matches fully; longer terms starting
+        with it match at PREFIX_WEIGHT, so results update as the user types.
+        """
+        matches = {}
+        for term in SYNONYMS.get(word, word).split():
+            if term in self.idf:
+                matches[term] = 1.0
+            if len(term) < MIN_PREFIX:
+                continue
+            start = bisect.bisect_left(self.terms, term)
+            for other in self.terms[start:]:
+                if not other.startswith(term):
+                    break
+                matches.setdefault(other, PREFIX_WEIGHT)
+        return matches
+
+    def filter_pool(self, filters):
+        """
+        Card indexes passing structured filters, in catalog order.
+
+        Args:
+            filters (dict): Any of 'issuer', 'network', 'currency' (exact values),
+            'min_fee' and 'max_fee' (dollars) and 'is_business' (bool).
+        """
+        pool = None
+        for field in FILTER_FIELDS:
+            if filters.get(field):
+                matching = self.fields[field].get(filters[field], set())
+                pool = matching if pool is None else pool & matching
+        indexes = sorted(pool) if pool is not None else range(len(self.cards))
+
+        def passes(index):
+            fee = self.fees[index]
+            if filters.get("min_fee") is not None and fee < filters["min_fee"]:
+                return False
+            if filters.get("max_fee") is not None and fee > filters["max_fee"]:
+                return False
+            if filters.get("is_business") is not None and self.business[index] != filters["is_business"]:
+                return False
+            return True
+
+        return [index for index in indexes if passes(index)]
+
+    def search(self, query, filters=None, page=1, per_page=24):
+        """
+        Search the catalog for the browse page.
+
+        Every word in the query must match a card (exactly or as a prefix)
+        somewhere in its name, issuer, network, currency, credits or offers.
+        Results are ranked by relevance; with no query they keep catalog order.
+
+        Returns:
+            tuple: (list of cards on the requested page, total number of matches)
+        """
+        pool = self.filter_pool(filters or {})
+        words = tokenize(query)
+        # Drop filler words like 'card', unless that is all the user typed.
+        words = [word for word in words if word not in STOP_WORDS] or words
+
+        if words:
+            scores = None
+            for word in words:
+                word_scores = defaultdict(float)
+                for term, weight in self.expand(word).items():
+                    idf = self.idf[term]
+                    for index, term_weight in self.postings[term]:
+                        word_scores[index] = max(word_scores[index], term_weight * idf * weight)
+                if scores is None:
+                    scores = word_scores
+                else:
+                    scores = {index: score + word_scores[index] for index, score in scores.items() if index in word_scores}
+            pool = sorted((index for index in pool if index in scores), key=lambda index: -scores[index])
+
+        start = (max(page, 1) - 1) * per_page
+        return [self.cards[index] for index in pool[start:start + per_page]], len(pool)
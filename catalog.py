@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Sequence
+from card_search import CardIndex
+from catalog_snapshot import SnapshotCards, snapshot_path, write_snapshot
+
+CARDS_URL = "https://raw.githubusercontent.com/andenacitelli/credit-card-bonuses-api/main/exports/data.json"
+CACHE_PATH = "cards_cache.json"
+
+# How often (in seconds) the background thread checks for a new catalog.
+# Set CATALOG_REFRESH_INTERVAL=0 to disable background refreshes.
+REFRESH_INTERVAL = int(os.getenv("CATALOG_REFRESH_INTERVAL", 6 * 60 * 60))
+
+
+def normalize_name(name):
+    """Normalize a card name so lookups are case-insensitive."""
+    if not isinstance(name, str):
+        return ''
+    return name.lower()
+
+
+def catalog_version(cards):
+    """A short fingerprint of the catalog contents, used to detect changes."""
+    encoded = json.dumps(list(cards), sort_keys=True).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+class CardCatalog:
+    """
+    An indexed, read-only snapshot of the credit card catalog.
+
+    The indexes are built once when the snapshot is created. Refreshing the
+    catalog builds a brand new CardCatalog and swaps the reference, so readers
+    never see a partially built index.
+
+    The cards are either a plain list or a SnapshotCards mapped from a
+    compiled snapshot file. The indexes hold positions in the card sequence,
+    so a mapped catalog only decodes the cards that are asked for.
+    """
+
+    def __init__(self, cards, updated_at=None, version=None):
+        self.cards = cards if isinstance(cards, Sequence) else list(cards)
+        # UNIX time the catalog data last changed, used for Last-Modified headers.
+        self.updated_at = updated_at or time.time()
+        self.by_id = {}
+        self.by_name = {}
+        by_issuer = defaultdict(list)
+        by_currency = defaultdict(list)
+        by_network = defaultdict(list)
+
+        for position, card in enumerate(self.cards):
+            # Keep the first match to preserve the old linear-scan behaviour.
+            self.by_id.setdefault(card.get('cardId'), position)
+            self.by_name.setdefault(normalize_name(card.get('name')), position)
+            by_issuer[card.get('issuer')].append(position)
+            by_currency[card.get('currency')].append(position)
+            by_network[card.get('network')].append(position)
+
+        self.by_issuer = dict(by_issuer)
+        self.by_currency = dict(by_currency)
+        self.by_network = dict(by_network)
+
+        self.version = version or catalog_version(self.cards)
+        self._search_index = None
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """Map a compiled snapshot file (see catalog_snapshot.py)."""
+        cards = SnapshotCards(path)
+        return cls(cards, cards.updated_at, cards.version)
+
+    def _get(self, position):
+        return None if position is None else self.cards[position]
+
+    @property
+    def search_index(self):
+        """The catalog's CardIndex, built on first use and kept for the life of this snapshot."""
+        if self._search_index is None:
+            self._search_index = CardIndex(self.cards)
+        return self._search_index
+
+    def __len__(self):
+        return len(self.cards)
+
+    def get_by_id(self, card_id):
+        """Return the card with the given ID, or None."""
+        return self._get(self.by_id.get(card_id))
+
+    def get_by_name(self, card_name):
+        """Return the card with the given name (case-insensitive), or None."""
+        return self._get(self.by_name.get(normalize_name(card_name)))
+
+    def get_by_issuer(self, issuer):
+        """Return all cards from an issuer, e.g. 'AMERICAN_EXPRESS'."""
+        return [self.cards[position] for position in self.by_issuer.get(issuer, [])]
+
+    def get_by_currency(self, currency):
+        """Return all cards that earn a given rewards currency, e.g. 'DELTA'."""
+        return [self.cards[position] for position in self.by_currency.get(currency, [])]
+
+    def get_by_network(self, network):
+        """Return all cards on a payment network, e.g. 'VISA'."""
+        return [self.cards[position] for position in self.by_network.get(network, [])]
+
+
+def load_cached_cards(cache_path=CACHE_PATH):
+    """Load the card list from the local cache file, or [] if it is missing."""
+    if not os.path.exists(cache_path):
+        print("No card data available.")
+        return []
+    try:
+        with open(cache_path) as f:
+            cards = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read card cache: {e}")
+        return []
+    print(f"Loaded {len(cards)} cards from local cache.")
+    return cards
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def load_catalog(cache_path=CACHE_PATH):
+    """
+    Load the catalog by mapping its compiled snapshot file.
+
+    If the snapshot is missing or older than the JSON cache, it is compiled
+    from the cache first. Falls back to an in-memory catalog if the snapshot
+    cannot be written or read.
+    """
+    path = snapshot_path(cache_path)
+    cache_mtime = _mtime(cache_path)
+    snapshot_mtime = _mtime(path)
+    if snapshot_mtime is None or (cache_mtime is not None and snapshot_mtime < cache_mtime):
+        cards = load_cached_cards(cache_path)
+        try:
+            write_snapshot(path, cards, catalog_version(cards), cache_mtime)
+        except OSError as e:
+            print(f"Could not write card snapshot: {e}")
+            return CardCatalog(cards, cache_mtime)
+    try:
+        catalog = CardCatalog.from_snapshot(path)
+    except (OSError, ValueError) as e:
+        print(f"Could not map card snapshot: {e}")
+        return CardCatalog(load_cached_cards(cache_path), cache_mtime)
+    print(f"Mapped {len(catalog)} cards from {path}.")
+    return catalog
+
+
+class CatalogRefresher:
+    """
+    Refreshes a Database's catalog from the bonuses API in a background thread.
+
+    Requests are conditional (If-None-Match / If-Modified-Since), so an
+    unchanged catalog costs a single 304 response. The validators are stored
+    next to the cache file, shared by every worker and re-read before each
+    request.
+
+    A new catalog is compiled into the snapshot file once; before fetching,
+    other workers notice the new file and map it instead of downloading and
+    parsing the JSON themselves.
+    """
+
+    def __init__(self, db, url=CARDS_URL, cache_path=CACHE_PATH,
+                 interval=REFRESH_INTERVAL, timeout=10):
+        self.db = db
+        self.url = url
+        self.cache_path = cache_path
+        self.meta_path = os.path.splitext(cache_path)[0] + ".meta.json"
+        self.snapshot_path = snapshot_path(cache_path)
+        self.interval = interval
+        self.timeout = timeout
+        self._stop = threading.Event()
+        self._thread = None
+        self.loaded_mtime = None
+
+        self.etag = None
+        self.last_modified = None
+        self._read_meta()
+
+    def _read_meta(self):
+        # Pick up the validators of whichever worker wrote the cache files last.
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.etag = meta.get("etag")
+        self.last_modified = meta.get("last_modified")
+
+    def load(self):
+        """Load the catalog from the snapshot file, remembering which version of the file was mapped."""
+        catalog = load_catalog(self.cache_path)
+        self.loaded_mtime = _mtime(self.snapshot_path)
+        return catalog
+
+    def _write_json(self, path, data):
+        # Write to a temporary file first so other workers never read a partial file.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def refresh(self):
+        """Fetch the catalog if it changed. Returns True if a new catalog was loaded."""
+        # Imported here so starting a worker does not wait for it; this runs in the refresh thread.
+        import requests
+
+        # Another worker may have already fetched and compiled a newer catalog.
+        mtime = _mtime(self.snapshot_path)
+        if mtime is not None and mtime != self.loaded_mtime:
+            self._read_meta()
+            self.db.set_catalog(self.load())
+            return True
+        self._read_meta()
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        try:
+            response = requests.get(self.url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                # A worker may have compiled the snapshot while this request was in flight.
+                mtime = _mtime(self.snapshot_path)
+                if mtime is not None and mtime != self.loaded_mtime:
+                    self.db.set_catalog(self.load())
+                    return True
+                return False
+            response.raise_for_status()
+            card_data = response.json()
+        except Exception as e:
+            print(f"Fetch failed: {e}")
+            return False
+
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        try:
+            self._write_json(self.cache_path, card_data)
+            self._write_json(self.meta_path, {"etag": self.etag, "last_modified": self.last_modified})
+            write_snapshot(self.snapshot_path, card_data, catalog_version(card_data), time.time())
+            self.db.set_catalog(self.load())
+        except OSError as e:
+            print(f"Could not write card cache: {e}")
+            self.db.set_card_data(card_data)
+
+        print(f"Fetched {len(card_data)} cards from GitHub.")
+        return True
+
+    def start(self):
+        """Start refreshing in a daemon thread. Does nothing if the interval is 0."""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread."""
+        self._stop.set()
+
+    def _run(self):
+        # Check once right away, then on every interval.
+        self.refresh()
+        while not self._stop.wait(self.interval):
+            self.refresh()
@@ -0,0 +1,75 @@
+import json
+import mmap
+import os
+import struct
+from collections.abc import Sequence
+
+# File layout: MAGIC, the header length (8 bytes, little-endian), a JSON
+# header, then one compact JSON record per card. The header holds the
+# catalog version, its update time and each record's (start, length)
+# relative to the first record.
+MAGIC = b"CNSNAP1\n"
+_LENGTH = struct.Struct("<Q")
+
+
+def snapshot_path(cache_path):
+    """Where the compiled snapshot for a JSON cache file lives."""
+    return os.path.splitext(cache_path)[0] + ".snapshot"
+
+
+def write_snapshot(path, cards, version, updated_at=None):
+    """
+    Compile a list of cards into a snapshot file.
+
+    The file is written under a temporary name and renamed into place, so
+    workers mapping the old file keep a consistent view until they remap.
+    """
+    records = [json.dumps(card, separators=(",", ":")).encode("utf-8") for card in cards]
+    offsets = []
+    position = 0
+    for record in records:
+        offsets.append((position, len(record)))
+        position += len(record)
+    header = json.dumps({"version": version, "updated_at": updated_at, "offsets": offsets}).encode("utf-8")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_LENGTH.pack(len(header)))
+        f.write(header)
+        for record in records:
+            f.write(record)
+    os.replace(tmp_path, path)
+
+
+class SnapshotCards(Sequence):
+    """
+    The cards of a snapshot file, memory-mapped read-only and decoded on access.
+
+    Every gunicorn worker maps the same file, so the card data lives once in
+    the OS page cache instead of once per worker. Each access returns a new
+    dict, so callers cannot change the catalog by mutating a card.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a card catalog snapshot")
+        start = len(MAGIC) + _LENGTH.size
+        (header_length,) = _LENGTH.unpack(self._map[len(MAGIC):start])
+        header = json.loads(self._map[start:start + header_length])
+        self.version = header["version"]
+        self.updated_at = header["updated_at"]
+        self._offsets = header["offsets"]
+        self._base = start + header_length
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        start, length = self._offsets[index]
+        start += self._base
+        return json.loads(self._map[start:start + length])
@@ -0,0 +1,196 @@
+import os
+import re
+import threading
+from cachetools import LRUCache
+
+# Merchant names and keywords, as they appear in bank statement descriptions,
+# for each spending category. Categories match the ones rewards.py knows.
+MERCHANT_RULES = {
+    "Food & Drink": (
+        "starbucks", "dunkin", "coffee", "cafe", "mcdonald", "burger king", "wendys", "taco bell",
+        "chipotle", "subway", "domino", "pizza", "panera", "chick fil a", "kfc", "popeyes",
+        "restaurant", "grill", "bistro", "diner", "bakery", "bar", "pub", "brewery",
+        "doordash", "grubhub", "uber eats", "ubereats", "postmates", "seamless",
+    ),
+    "Groceries": (
+        "grocery", "groceries", "supermarket", "whole foods", "wholefds", "trader joe", "kroger",
+        "safeway", "publix", "aldi", "wegmans", "heb", "albertsons", "food lion", "sprouts",
+        "instacart", "costco", "sams club",
+    ),
+    "Transportation": (
+        "uber", "lyft", "taxi", "shell", "chevron", "exxon", "exxonmobil", "mobil", "bp", "sunoco",
+        "valero", "citgo", "speedway", "wawa", "gas station", "fuel", "parking", "toll", "ezpass",
+        "e zpass", "metro", "transit", "mta",
+    ),
+    "Travel": (
+        "airline", "airlines", "delta air", "united airl", "american air", "southwest", "jetblue",
+        "alaska air", "spirit airl", "frontier airl", "expedia", "booking com", "airbnb", "vrbo", "hotel",
+        "marriott", "hilton", "hyatt", "ihg", "amtrak", "hertz", "avis", "enterprise rent",
+    ),
+    "Shopping": (
+        "amazon", "amzn", "walmart", "target", "best buy", "ebay", "etsy", "home depot", "lowes",
+        "ikea", "macys", "nordstrom", "tj maxx", "marshalls", "kohls", "apple store",
+    ),
+    "Entertainment": (
+        "cinema", "theater", "theatre", "amc", "regal", "ticketmaster", "stubhub", "steampowered", "steam games",
+        "playstation", "xbox", "nintendo", "disney",
+    ),
+    "Subscriptions": (
+        "netflix", "spotify", "hulu", "disney plus", "hbo", "youtube", "apple com bill",
+        "prime video", "audible", "patreon", "subscription",
+    ),
+    "Utilities": (
+        "electric", "electricity", "power", "water", "gas bill", "utility", "comcast", "xfinity",
+        "verizon", "at t", "t mobile", "spectrum", "internet", "phone bill",
+    ),
+    "Health": (
+        "pharmacy", "cvs", "walgreens", "rite aid", "doctor", "dental", "dentist", "clinic",
+        "hospital", "medical", "gym", "fitness", "planet fitness",
+    ),
+    "Income": (
+        "salary", "payroll", "direct dep", "direct deposit", "paycheck", "interest paid", "dividend",
+    ),
+}
+
+# Descriptions remembered across uploads, with the category the rules gave them.
+MEMO_SIZE = int(os.getenv("CATEGORY_MEMO_SIZE", 100_000))
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_description(description):
+    """
+    Reduce a statement description to lowercase words, without store numbers and reference codes.
+
+    'STARBUCKS #1234 SEATTLE WA' and 'Starbucks 5678 Seattle WA' both become
+    'starbucks seattle wa', so they share one memo entry.
+    """
+    words = _NON_WORD.sub(" ", (description or "").lower()).split()
+    return " ".join(word for word in words if not any(char.isdigit() for char in word))
+
+
+class KeywordMatcher:
+    """
+    An Aho-Corasick automaton over whole-word keywords.
+
+    Finds every keyword in a description in one pass, however many keywords
+    there are, and returns the value of the longest one (the leftmost, on a
+    tie), so 'uber eats' wins over 'uber'.
+    """
+
+    def __init__(self, keywords):
+        """
+        Args:
+            keywords (dict): Keyword -> value. Keywords are normalized like descriptions.
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [()]  # node -> ((keyword length, value), ...)
+        for keyword, value in keywords.items():
+            keyword = normalize_description(keyword)
+            if not keyword:
+                continue
+            node = 0
+            for char in keyword:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append(())
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            self._outputs[node] = ((len(keyword), value),)
+
+        # Breadth-first, so every node's failure link is ready before its children need it.
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0) if node else 0
+                self._outputs[child] += self._outputs[self._fail[child]]
+                queue.append(child)
+
+    def match(self, text):
+        """The value of the longest whole-word keyword in normalized text, or None."""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        best_length, best_start, best_value = 0, 0, None
+        node = 0
+        last = len(text) - 1
+        for end, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not outputs[node] or (end < last and text[end + 1] != " "):
+                continue
+            for length, value in outputs[node]:
+                start = end - length + 1
+                if start and text[start - 1] != " ":
+                    continue
+                if length > best_length or (length == best_length and start < best_start):
+                    best_length, best_start, best_value = length, start, value
+        return best_value
+
+
+_rules_matcher = KeywordMatcher({
+    keyword: category for category, keywords in MERCHANT_RULES.items() for keyword in keywords
+})
+_memo = LRUCache(maxsize=MEMO_SIZE)
+_memo_lock = threading.Lock()
+
+
+def rule_category(description):
+    """The category the built-in merchant rules give a normalized description, or None."""
+    with _memo_lock:
+        if description in _memo:
+            return _memo[description]
+    category = _rules_matcher.match(description)
+    with _memo_lock:
+        _memo[description] = category
+    return category
+
+
+class Categorizer:
+    """
+    Fills in transaction categories from their descriptions.
+
+    A user's overrides (pattern -> category, see Database.get_category_overrides)
+    are checked first and apply even when the statement has its own category;
+    the built-in merchant rules only fill in missing ones. Each distinct
+    description is only matched once.
+    """
+
+    def __init__(self, overrides=None):
+        self._overrides = KeywordMatcher(overrides) if overrides else None
+        self._seen = {}  # description -> (override, rule category)
+
+    def _lookup(self, description):
+        result = self._seen.get(description)
+        if result is None:
+            text = normalize_description(description)
+            override = self._overrides.match(text) if self._overrides else None
+            result = self._seen[description] = (override, None if override else rule_category(text))
+        return result
+
+    def override(self, description):
+        """The category a user's overrides give a description, or None."""
+        return self._lookup(description)[0]
+
+    def categorize(self, description, category=None):
+        """
+        The category for a transaction.
+
+        Args:
+            description (str): The transaction's description.
+            category (str): The category from the statement, if it has one.
+        """
+        if not description:
+            return category
+        override, rule = self._lookup(description)
+        return override or category or rule
+
+    def categorize_rows(self, rows):
+        """Set the 'Category' of transaction rows (see ingest.normalize_chunk) in place."""
+        for row in rows:
+            row["Category"] = self.categorize(row.get("Description"), row.get("Category"))
+        return rows
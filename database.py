@@ -1,38 +1,108 @@
-import sqlite3
-import requests
+import hashlib
 import json
 import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from catalog import CACHE_PATH, CardCatalog, CatalogRefresher
+
+# Seconds a connection waits for a lock held by another worker before failing.
+BUSY_TIMEOUT = 10
+# Number of prepared statements each connection keeps for reuse.
+STATEMENT_CACHE_SIZE = 256
+# Applied to every new connection. WAL lets readers and a writer work at the
+# same time, which matters with several gunicorn workers sharing one file.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",  # 8 MB page cache
+    "PRAGMA mmap_size=67108864",  # 64 MB of memory-mapped I/O
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT * 1000}",
+)
+
+def transaction_key(date, description, amount):
+    """The fields that identify a transaction, normalized for comparison."""
+    description = ' '.join(str(description or '').lower().split())
+    return (date, description, f"{float(amount or 0):.2f}")
+
+def transaction_hash(key, occurrence=0):
+    """
+    Fingerprint a transaction so the same purchase in two overlapping exports
+    is only stored once.
+
+    'occurrence' tells apart identical rows within one statement (e.g. two
+    coffees on the same day), so those are still kept.
+    """
+    raw = '|'.join(map(str, (*key, occurrence)))
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
 
 class Database:
-    def __init__(self, db_name='credit_cards.db'):
+    def __init__(self, db_name='credit_cards.db', cache_path=CACHE_PATH):
         self.db_name = db_name
+        # One pooled connection per thread (and per process, after a fork).
+        self._local = threading.local()
 
-        # Fetch credit card data from GitHub or local cache.
-        self.card_data = []
-        try:
-            credit_cards_url = "https://raw.githubusercontent.com/andenacitelli/credit-card-bonuses-api/main/exports/data.json"
-            response = requests.get(credit_cards_url)
-            response.raise_for_status()
-            self.card_data = response.json()
-            with open("cards_cache.json", "w") as f:
-                json.dump(self.card_data, f)
-            print(f"Fetched {len(self.card_data)} cards from GitHub.")
-        except Exception as e:
-            print(f"Fetch failed: {e}")
-            if os.path.exists("cards_cache.json"):
-                with open("cards_cache.json") as f:
-                    self.card_data = json.load(f)
-                print(f"Loaded {len(self.card_data)} cards from local cache.")
-            else:
-                print("No card data available.")
-
+        # Start instantly by mapping the local cache's compiled snapshot;
+        # refresh_catalog() and start_catalog_refresh() fetch newer data from GitHub.
+        self.catalog_refresher = CatalogRefresher(self, cache_path=cache_path)
+        self.set_catalog(self.catalog_refresher.load())
         self.init_db()
 
+    def set_catalog(self, catalog):
+        """Swap in a new CardCatalog as a single assignment."""
+        # Build the search index before the swap, so no request waits for it.
+        catalog.search_index
+        self.catalog = catalog
+
+    def set_card_data(self, card_data, updated_at=None):
+        """Build a new indexed catalog from a list of cards and swap it in."""
+        self.set_catalog(CardCatalog(card_data, updated_at))
+
+    def refresh_catalog(self):
+        """Fetch the latest catalog now if it changed. Returns True if it was updated."""
+        return self.catalog_refresher.refresh()
+
+    def start_catalog_refresh(self):
+        """Keep the catalog up to date in a background thread."""
+        self.catalog_refresher.start()
+
+    @property
+    def card_data(self):
+        """The raw list of cards in the current catalog."""
+        return list(self.catalog.cards)
+
     def get_connection(self):
-        conn = sqlite3.connect(self.db_name)
-        conn.row_factory = sqlite3.Row
+        """
+        Return this thread's pooled connection, opening it on first use.
+
+        Using the connection as a context manager commits or rolls back the
+        transaction but leaves the connection open for the next call.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # A connection inherited across a fork must not be reused.
+            conn = sqlite3.connect(
+                self.db_name,
+                timeout=BUSY_TIMEOUT,
+                cached_statements=STATEMENT_CACHE_SIZE,
+            )
+            conn.row_factory = sqlite3.Row
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
         return conn
 
+    def close_connection(self):
+        """Close this thread's pooled connection, if it has one."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
     def init_db(self):
         """Initialize the database and create the tables if they doesn't exist."""
         with self.get_connection() as conn:
@@ -53,33 +123,192 @@ class Database:
                     UNIQUE (user_id, card_id)
                 )
             ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS statements (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    filename TEXT,
+                    uploaded_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    row_count INTEGER DEFAULT 0,
+                    duplicate_count INTEGER DEFAULT 0,
+                    status TEXT DEFAULT 'processing',
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                )
+            ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    statement_id INTEGER NOT NULL,
+                    date TEXT,
+                    description TEXT,
+                    amount REAL NOT NULL DEFAULT 0,
+                    category TEXT,
+                    txn_hash TEXT NOT NULL,
+                    FOREIGN KEY (user_id) REFERENCES users(id),
+                    FOREIGN KEY (statement_id) REFERENCES statements(id),
+                    UNIQUE (user_id, txn_hash)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_transactions_statement
+                ON transactions (statement_id)
+            ''')
+            # Keyset pagination indexes; see get_transactions_page().
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+                ON transactions (user_id, COALESCE(date, ''), id)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_transactions_user_amount
+                ON transactions (user_id, amount, id)
+            ''')
+
+            # Per-user, per-month, per-category totals kept up to date by the
+            # triggers below, so the dashboard never has to scan the history.
+            # Amounts are stored in cents so repeated updates do not drift.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'spending_rollups'")
+            rollups_exist = cursor.fetchone() is not None
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS spending_rollups (
+                    user_id TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    total_cents INTEGER NOT NULL DEFAULT 0,
+                    txn_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, month, category)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS rollup_transaction_insert
+                AFTER INSERT ON transactions
+                BEGIN
+                    INSERT INTO spending_rollups (user_id, month, category, total_cents, txn_count)
+                    VALUES (NEW.user_id, COALESCE(substr(NEW.date, 1, 7), ''),
+                            COALESCE(NEW.category, 'Uncategorized'),
+                            CAST(round(NEW.amount * 100) AS INTEGER), 1)
+                    ON CONFLICT (user_id, month, category) DO UPDATE SET
+                        total_cents = total_cents + excluded.total_cents,
+                        txn_count = txn_count + 1;
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS rollup_transaction_delete
+                AFTER DELETE ON transactions
+                BEGIN
+                    UPDATE spending_rollups SET
+                        total_cents = total_cents - CAST(round(OLD.amount * 100) AS INTEGER),
+                        txn_count = txn_count - 1
+                    WHERE user_id = OLD.user_id
+                      AND month = COALESCE(substr(OLD.date, 1, 7), '')
+                      AND category = COALESCE(OLD.category, 'Uncategorized');
+                    DELETE FROM spending_rollups WHERE user_id = OLD.user_id AND txn_count <= 0;
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS rollup_transaction_update
+                AFTER UPDATE OF date, amount, category ON transactions
+                BEGIN
+                    UPDATE spending_rollups SET
+                        total_cents = total_cents - CAST(round(OLD.amount * 100) AS INTEGER),
+                        txn_count = txn_count - 1
+                    WHERE user_id = OLD.user_id
+                      AND month = COALESCE(substr(OLD.date, 1, 7), '')
+                      AND category = COALESCE(OLD.category, 'Uncategorized');
+                    INSERT INTO spending_rollups (user_id, month, category, total_cents, txn_count)
+                    VALUES (NEW.user_id, COALESCE(substr(NEW.date, 1, 7), ''),
+                            COALESCE(NEW.category, 'Uncategorized'),
+                            CAST(round(NEW.amount * 100) AS INTEGER), 1)
+                    ON CONFLICT (user_id, month, category) DO UPDATE SET
+                        total_cents = total_cents + excluded.total_cents,
+                        txn_count = txn_count + 1;
+                    DELETE FROM spending_rollups WHERE user_id = OLD.user_id AND txn_count <= 0;
+                END
+            ''')
+            # Cached responses shared by every worker; see response_cache.py.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    version TEXT,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    result TEXT,
+                    error TEXT,
+                    partial TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            # A token per user that changes whenever their cards or transactions
+            # do, so rendered dashboard fragments can be cached against it.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_data_versions (
+                    user_id TEXT PRIMARY KEY,
+                    version TEXT NOT NULL
+                )
+            ''')
+            # A user's own description pattern -> category rules; see categorizer.py.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS category_overrides (
+                    user_id TEXT NOT NULL,
+                    pattern TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    PRIMARY KEY (user_id, pattern),
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                )
+            ''')
+            if not rollups_exist:
+                # Backfill from any history stored before the rollups existed.
+                cursor.execute('''
+                    INSERT INTO spending_rollups (user_id, month, category, total_cents, txn_count)
+                    SELECT user_id, COALESCE(substr(date, 1, 7), ''), COALESCE(category, 'Uncategorized'),
+                           SUM(CAST(round(amount * 100) AS INTEGER)), COUNT(*)
+                    FROM transactions
+                    GROUP BY 1, 2, 3
+                ''')
             conn.commit()
 
     # All of the following methods are for accessing the credit cards.
     def get_card_id_by_name(self, card_name):
         """Retrieve the ID of a credit card by its name."""
-        for card in self.card_data:
-            if card['name'].lower() == card_name.lower():
-                return card['cardId']
-        return None
+        card = self.catalog.get_by_name(card_name)
+        return card['cardId'] if card else None
 
     def get_card(self, card_name):
         """Retrieve a credit card by its name."""
-        for card in self.card_data:
-            if card['name'].lower() == card_name.lower():
-                return card
-        return None
+        return self.catalog.get_by_name(card_name)
 
     def get_card_by_id(self, card_id):
         """Retrieve a credit card by its ID."""
-        for card in self.card_data:
-            if card['cardId'] == card_id:
-                return card
-        return None
+        return self.catalog.get_by_id(card_id)
 
     def get_cards(self):
         """Retrieve all credit cards."""
-        return self.card_data
+        return list(self.catalog.cards)
+
+    def get_cards_by_issuer(self, issuer):
+        """Retrieve all credit cards from an issuer."""
+        return self.catalog.get_by_issuer(issuer)
+
+    def get_cards_by_currency(self, currency):
+        """Retrieve all credit cards earning a rewards currency."""
+        return self.catalog.get_by_currency(currency)
+
+    def get_cards_by_network(self, network):
+        """Retrieve all credit cards on a payment network."""
+        return self.catalog.get_by_network(network)
 
     # All of the following methods are for managing the user table.
     def add_user(self, id, email, balance=0):
@@ -124,13 +353,11 @@ class Database:
     # All of the following methods are for managing the users' credit cards.
     def add_user_card(self, user_id, card_id):
         """Add a credit card to a user's account."""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR IGNORE INTO user_cards (user_id, card_id)
-                VALUES (?, ?)
-            ''', (user_id, card_id))
-            conn.commit()
+        self.update_user_cards(user_id, add=[card_id])
+
+    def add_user_cards(self, user_id, card_ids):
+        """Add several credit cards to a user's account in one transaction."""
+        return self.update_user_cards(user_id, add=card_ids)
 
     def get_user_cards(self, user_id):
         """Retrieve all credit cards associated with a user."""
@@ -140,21 +367,528 @@ class Database:
                 SELECT card_id FROM user_cards WHERE user_id = ?
             ''', (user_id,))
             ids = [row[0] for row in cursor.fetchall()]  # extract card_id strings
+            catalog = self.catalog
             user_cards = []
             for card_id in ids:
-                match = next((card for card in self.card_data if card.get('cardId') == card_id), None)
+                match = catalog.get_by_id(card_id)
                 if match:
                     user_cards.append(match)
 
             return user_cards
 
+    def get_user_card_ids(self, user_id):
+        """Retrieve the IDs of a user's credit cards, without looking them up in the catalog."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT card_id FROM user_cards WHERE user_id = ?', (user_id,))
+            return [row[0] for row in cursor.fetchall()]
+
     def remove_user_card(self, user_id, card_id):
         """Remove a credit card from a user's account."""
+        self.update_user_cards(user_id, remove=[card_id])
+
+    def remove_user_cards(self, user_id, card_ids):
+        """Remove several credit cards from a user's account in one transaction."""
+        return self.update_user_cards(user_id, remove=card_ids)
+
+    def update_user_cards(self, user_id, add=(), remove=()):
+        """
+        Add and remove a user's credit cards in a single transaction.
+
+        Cards the user already has are not added again, and cards they do
+        not have are skipped. A card in both lists ends up removed.
+
+        Returns:
+            bool: Whether the user's cards changed.
+        """
+        add = list(dict.fromkeys(add))
+        remove = list(dict.fromkeys(remove))
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            changes = conn.total_changes
+            cursor.executemany('''
+                INSERT OR IGNORE INTO user_cards (user_id, card_id)
+                VALUES (?, ?)
+            ''', [(user_id, card_id) for card_id in add])
+            cursor.executemany('''
                 DELETE FROM user_cards WHERE user_id = ? AND card_id = ?
-            ''', (user_id, card_id))
+            ''', [(user_id, card_id) for card_id in remove])
+            changed = conn.total_changes != changes
+            if changed:
+                self._bump_data_version(cursor, user_id)
+            conn.commit()
+            return changed
+
+    def replace_user_cards(self, user_id, card_ids):
+        """
+        Make a user's credit cards exactly the given ones, in a single transaction.
+
+        Returns:
+            bool: Whether the user's cards changed.
+        """
+        card_ids = list(dict.fromkeys(card_ids))
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            changes = conn.total_changes
+            cursor.execute('''
+                DELETE FROM user_cards
+                WHERE user_id = ? AND card_id NOT IN (SELECT value FROM json_each(?))
+            ''', (user_id, json.dumps(card_ids)))
+            cursor.executemany('''
+                INSERT OR IGNORE INTO user_cards (user_id, card_id)
+                VALUES (?, ?)
+            ''', [(user_id, card_id) for card_id in card_ids])
+            changed = conn.total_changes != changes
+            if changed:
+                self._bump_data_version(cursor, user_id)
+            conn.commit()
+            return changed
+
+    def _bump_data_version(self, cursor, user_id):
+        # Called inside the transaction that changes the user's data.
+        cursor.execute('''
+            INSERT INTO user_data_versions (user_id, version) VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET version = excluded.version
+        ''', (user_id, uuid.uuid4().hex))
+
+    def get_data_version(self, user_id):
+        """
+        Retrieve the token that changes whenever a user's cards or transactions change.
+
+        A user without one gets a fresh token, so tokens are never reused,
+        even after the table is cleared.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT version FROM user_data_versions WHERE user_id = ?', (user_id,))
+            row = cursor.fetchone()
+            if row:
+                return row[0]
+            version = uuid.uuid4().hex
+            cursor.execute('''
+                INSERT OR IGNORE INTO user_data_versions (user_id, version) VALUES (?, ?)
+            ''', (user_id, version))
+            conn.commit()
+            cursor.execute('SELECT version FROM user_data_versions WHERE user_id = ?', (user_id,))
+            return cursor.fetchone()[0]
+
+    # All of the following methods are for managing uploaded transactions.
+    def add_statement(self, user_id, filename=None):
+        """Create a statement record for an upload and return its ID."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO statements (user_id, filename)
+                VALUES (?, ?)
+            ''', (user_id, filename))
+            conn.commit()
+            return cursor.lastrowid
+
+    def get_statement(self, user_id, statement_id):
+        """Retrieve a user's statement record, including its status and row count."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM statements WHERE id = ? AND user_id = ?
+            ''', (statement_id, user_id))
+            return cursor.fetchone()
+
+    def set_statement_status(self, statement_id, status):
+        """Mark a statement as 'processing', 'complete' or 'failed'."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE statements SET status = ? WHERE id = ?', (status, statement_id))
+            conn.commit()
+
+    def delete_statement(self, user_id, statement_id):
+        """Delete a statement and all of its transactions."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM transactions WHERE user_id = ? AND statement_id = ?
+            ''', (user_id, statement_id))
+            cursor.execute('''
+                DELETE FROM statements WHERE id = ? AND user_id = ?
+            ''', (statement_id, user_id))
+            self._bump_data_version(cursor, user_id)
+            conn.commit()
+
+    def add_transactions(self, user_id, statement_id, rows, seen=None):
+        """
+        Append transactions to a user's history in a single transaction,
+        skipping any that are already stored (see transaction_hash).
+
+        Each row is a dict with 'Date', 'Description', 'Amount' and 'Category' keys.
+        Pass the same 'seen' Counter for every chunk of one statement so repeated
+        rows are numbered consistently across chunks.
+
+        Returns:
+            int: The number of new transactions stored.
+        """
+        seen = Counter() if seen is None else seen
+        values = []
+        for row in rows:
+            date, description = row.get('Date'), row.get('Description')
+            amount = float(row.get('Amount') or 0)
+            key = transaction_key(date, description, amount)
+            txn_hash = transaction_hash(key, seen[key])
+            seen[key] += 1
+            values.append((user_id, statement_id, date, description, amount, row.get('Category'), txn_hash))
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT OR IGNORE INTO transactions
+                    (user_id, statement_id, date, description, amount, category, txn_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', values)
+            stored = max(cursor.rowcount, 0)
+            cursor.execute('''
+                UPDATE statements
+                SET row_count = row_count + ?, duplicate_count = duplicate_count + ?
+                WHERE id = ? AND user_id = ?
+            ''', (stored, len(values) - stored, statement_id, user_id))
+            if stored:
+                self._bump_data_version(cursor, user_id)
+            conn.commit()
+        return stored
+
+    def recategorize_transactions(self, user_id, categorize):
+        """
+        Re-run categorization over a user's stored transactions in a single transaction.
+
+        Args:
+            categorize (callable): Called with each distinct description; returns
+                the new category, or None to leave those transactions alone.
+
+        Returns:
+            int: The number of transactions whose category changed.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT DISTINCT description FROM transactions
+                WHERE user_id = ? AND description IS NOT NULL
+            ''', (user_id,))
+            updates = []
+            for (description,) in cursor.fetchall():
+                category = categorize(description)
+                if category:
+                    updates.append((category, user_id, description, category))
+            cursor.executemany('''
+                UPDATE transactions SET category = ?
+                WHERE user_id = ? AND description = ? AND category IS NOT ?
+            ''', updates)
+            changed = max(cursor.rowcount, 0)
+            if changed:
+                self._bump_data_version(cursor, user_id)
+            conn.commit()
+        return changed
+
+    def get_statements(self, user_id):
+        """Retrieve all of a user's uploaded statements, newest first."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM statements WHERE user_id = ? ORDER BY id DESC
+            ''', (user_id,))
+            return cursor.fetchall()
+
+    def get_transactions(self, user_id, statement_id=None):
+        """
+        Retrieve a user's transaction history as a list of dicts, in upload order.
+        Pass a statement_id to only get the transactions from that upload.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if statement_id is None:
+                cursor.execute('''
+                    SELECT date, description, amount, category FROM transactions
+                    WHERE user_id = ?
+                    ORDER BY id
+                ''', (user_id,))
+            else:
+                cursor.execute('''
+                    SELECT date, description, amount, category FROM transactions
+                    WHERE user_id = ? AND statement_id = ?
+                    ORDER BY id
+                ''', (user_id, statement_id))
+            return [
+                {
+                    'Date': row['date'],
+                    'Description': row['description'],
+                    'Amount': row['amount'],
+                    'Category': row['category'],
+                }
+                for row in cursor.fetchall()
+            ]
+
+    def get_transactions_page(self, user_id, sort_column='Date', descending=False, start=None,
+                              end=None, category=None, limit=50, after=None):
+        """
+        Retrieve one page of a user's transactions using keyset pagination.
+
+        Instead of an OFFSET, each page continues from the sort key of the last
+        row of the previous page, so every page costs the same no matter how deep.
+
+        Args:
+            sort_column (str): 'Date' or 'Amount'.
+            descending (bool): Sort direction.
+            start (str): Optional first date, 'YYYY-MM-DD'.
+            end (str): Optional last date, 'YYYY-MM-DD'.
+            category (str): Optional category; 'Uncategorized' matches rows without one.
+            limit (int): The page size.
+            after (tuple): The (sort value, id) cursor returned with the previous page.
+
+        Returns:
+            tuple: (list of row dicts, cursor for the next page or None)
+        """
+        sort_expr = "amount" if sort_column == 'Amount' else "COALESCE(date, '')"
+        direction = "DESC" if descending else "ASC"
+        comparison = "<" if descending else ">"
+
+        conditions = ["user_id = ?"]
+        params = [user_id]
+        if start:
+            conditions.append("date >= ?")
+            params.append(start)
+        if end:
+            conditions.append("date <= ?")
+            params.append(end)
+        if category:
+            conditions.append("COALESCE(category, 'Uncategorized') = ?")
+            params.append(category)
+        if after is not None:
+            conditions.append(f"({sort_expr}, id) {comparison} (?, ?)")
+            params.extend(after)
+
+        # Fetch one extra row to know whether there is another page.
+        params.append(limit + 1)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT id, date, description, amount, category, {sort_expr} AS sort_key
+                FROM transactions
+                WHERE {" AND ".join(conditions)}
+                ORDER BY {sort_expr} {direction}, id {direction}
+                LIMIT ?
+            ''', params)
+            rows = cursor.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]['sort_key'], rows[-1]['id'])
+        page = [
+            {
+                'id': row['id'],
+                'Date': row['date'],
+                'Description': row['description'],
+                'Amount': row['amount'],
+                'Category': row['category'] or 'Uncategorized',
+            }
+            for row in rows
+        ]
+        return page, next_cursor
+
+    def get_category_totals(self, user_id):
+        """
+        Retrieve a user's spending totals per category from the rollups.
+
+        Returns:
+            list: (category, total amount, transaction count) tuples.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT category, SUM(total_cents), SUM(txn_count) FROM spending_rollups
+                WHERE user_id = ?
+                GROUP BY category
+                ORDER BY category
+            ''', (user_id,))
+            return [(row[0], row[1] / 100, row[2]) for row in cursor.fetchall()]
+
+    def get_monthly_totals(self, user_id):
+        """
+        Retrieve a user's spending totals per month and category from the rollups.
+
+        Returns:
+            list: (month 'YYYY-MM', category, total amount, transaction count) tuples, oldest first.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT month, category, total_cents, txn_count FROM spending_rollups
+                WHERE user_id = ?
+                ORDER BY month, category
+            ''', (user_id,))
+            return [(row[0], row[1], row[2] / 100, row[3]) for row in cursor.fetchall()]
+
+    def get_spending_summary(self, user_id, top_merchants=3):
+        """
+        Summarize a user's spending (negative amounts) for the rewards analysis.
+
+        The aggregation happens in SQLite, so the summary stays the same size
+        however long the user's history is.
+
+        Returns:
+            dict: 'categories', a list of (category, total, count, merchants) tuples,
+            biggest spend first, where merchants are the category's top
+            (description, total, count) tuples; and 'months', a list of
+            (month 'YYYY-MM', total, count) tuples, oldest first. Totals are
+            positive dollar amounts.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT category, description, total_cents, txn_count FROM (
+                    SELECT COALESCE(category, 'Uncategorized') AS category, description,
+                           -SUM(CAST(round(amount * 100) AS INTEGER)) AS total_cents,
+                           COUNT(*) AS txn_count,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY COALESCE(category, 'Uncategorized')
+                               ORDER BY SUM(amount), description
+                           ) AS rank
+                    FROM transactions
+                    WHERE user_id = ? AND amount < 0
+                    GROUP BY 1, 2
+                )
+                WHERE rank <= ?
+            ''', (user_id, top_merchants))
+            merchants = {}
+            for category, description, total_cents, count in cursor.fetchall():
+                merchants.setdefault(category, []).append((description, total_cents / 100, count))
+
+            cursor.execute('''
+                SELECT COALESCE(category, 'Uncategorized'),
+                       -SUM(CAST(round(amount * 100) AS INTEGER)), COUNT(*)
+                FROM transactions
+                WHERE user_id = ? AND amount < 0
+                GROUP BY 1
+                ORDER BY 2 DESC, 1
+            ''', (user_id,))
+            categories = [
+                (category, total_cents / 100, count, merchants.get(category, []))
+                for category, total_cents, count in cursor.fetchall()
+            ]
+
+            cursor.execute('''
+                SELECT substr(date, 1, 7), -SUM(CAST(round(amount * 100) AS INTEGER)), COUNT(*)
+                FROM transactions
+                WHERE user_id = ? AND amount < 0 AND date IS NOT NULL
+                GROUP BY 1
+                ORDER BY 1
+            ''', (user_id,))
+            months = [(month, total_cents / 100, count) for month, total_cents, count in cursor.fetchall()]
+        return {"categories": categories, "months": months}
+
+    # All of the following methods are for the users' category overrides.
+    def get_category_overrides(self, user_id):
+        """Retrieve a user's category overrides as a dict of pattern -> category."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT pattern, category FROM category_overrides WHERE user_id = ?', (user_id,))
+            return dict(cursor.fetchall())
+
+    def set_category_override(self, user_id, pattern, category):
+        """Make transactions whose description contains a pattern belong to a category."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO category_overrides (user_id, pattern, category) VALUES (?, ?, ?)
+                ON CONFLICT (user_id, pattern) DO UPDATE SET category = excluded.category
+            ''', (user_id, pattern, category))
+            conn.commit()
+
+    def remove_category_override(self, user_id, pattern):
+        """Remove one of a user's category overrides."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM category_overrides WHERE user_id = ? AND pattern = ?', (user_id, pattern))
+            conn.commit()
+
+    # All of the following methods are for the shared response cache.
+    def get_cached_response(self, namespace, key, version=None):
+        """Retrieve an unexpired cached response, or None."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT value FROM response_cache
+                WHERE namespace = ? AND key = ? AND version IS ? AND expires_at > ?
+            ''', (namespace, key, version, time.time()))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def set_cached_response(self, namespace, key, version, value, expires_at):
+        """Store a cached response until the given UNIX time."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO response_cache (namespace, key, version, value, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (namespace, key, version, value, expires_at))
+            conn.commit()
+
+    def purge_cached_responses(self, namespace, keep_version=None):
+        """
+        Delete a namespace's cached responses. If keep_version is given, only
+        expired entries and entries from other versions are deleted.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if keep_version is None:
+                cursor.execute('DELETE FROM response_cache WHERE namespace = ?', (namespace,))
+            else:
+                cursor.execute('''
+                    DELETE FROM response_cache
+                    WHERE namespace = ? AND (version IS NOT ? OR expires_at <= ?)
+                ''', (namespace, keep_version, time.time()))
+            conn.commit()
+
+    # All of the following methods are for background jobs; see jobs.py.
+    def add_job(self, job_id, user_id, kind):
+        """Record a newly queued job."""
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO jobs (id, user_id, kind, status, created_at, updated_at)
+                VALUES (?, ?, ?, 'queued', ?, ?)
+            ''', (job_id, user_id, kind, now, now))
+            conn.commit()
+
+    def update_job(self, job_id, status, result=None, error=None):
+        """Update a job's status, and its result or error once it has finished."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?
+            ''', (status, result, error, time.time(), job_id))
+            conn.commit()
+
+    def update_job_partial(self, job_id, partial):
+        """Save the output a streaming job has produced so far."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE jobs SET partial = ?, updated_at = ? WHERE id = ?
+            ''', (partial, time.time(), job_id))
+            conn.commit()
+
+    def get_job(self, job_id, user_id):
+        """Retrieve a user's job, with its age in seconds since it was last updated."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT *, ? - updated_at AS age FROM jobs WHERE id = ? AND user_id = ?
+            ''', (time.time(), job_id, user_id))
+            return cursor.fetchone()
+
+    def purge_jobs(self, max_age):
+        """Delete jobs created more than max_age seconds ago."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM jobs WHERE created_at < ?', (time.time() - max_age,))
             conn.commit()
 
     # The following methods are for clearing the database.
@@ -163,6 +897,7 @@ class Database:
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM users')
+            cursor.execute('DELETE FROM category_overrides')
             conn.commit()
 
     def clear_user_cards(self):
@@ -170,16 +905,35 @@ class Database:
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM user_cards')
+            cursor.execute('DELETE FROM user_data_versions')
+            conn.commit()
+
+    def clear_transactions(self):
+        """Clear all uploaded statements and transactions from the database."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM transactions')
+            cursor.execute('DELETE FROM statements')
+            cursor.execute('DELETE FROM spending_rollups')
+            cursor.execute('DELETE FROM user_data_versions')
             conn.commit()
 
     def clear_database(self):
         """Clear the entire database."""
         self.clear_users()
         self.clear_user_cards()
+        self.clear_transactions()
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DROP TABLE IF EXISTS users')
             cursor.execute('DROP TABLE IF EXISTS user_cards')
+            cursor.execute('DROP TABLE IF EXISTS transactions')
+            cursor.execute('DROP TABLE IF EXISTS statements')
+            cursor.execute('DROP TABLE IF EXISTS spending_rollups')
+            cursor.execute('DROP TABLE IF EXISTS response_cache')
+            cursor.execute('DROP TABLE IF EXISTS jobs')
+            cursor.execute('DROP TABLE IF EXISTS user_data_versions')
+            cursor.execute('DROP TABLE IF EXISTS category_overrides')
             conn.commit()
         self.init_db()
 
@@ -0,0 +1,100 @@
+"""
+A local key set for signing Firebase ID tokens in tests, so logins can be
+tried without a real Firebase project.
+
+Run it with:
+    python fake_firebase_keys.py [directory]
+which writes certs.json ({key ID: PEM certificate}) and key.pem to the
+directory (the current one by default), and start the app with:
+    FIREBASE_CERTS_FILE=<directory>/certs.json
+
+Tokens for the key are made with sign_token, e.g.
+    sign_token("<directory>/key.pem", "my-project", "user1")
+and are accepted by TokenVerifier("my-project", certs_file="<directory>/certs.json").
+"""
+import datetime
+import json
+import os
+import sys
+import time
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+KEY_ID = "fake-key"
+# How long the generated certificate is valid for.
+CERT_DAYS = 365
+
+
+def write_key_set(directory=".", key_id=KEY_ID):
+    """
+    Generate an RSA key and a self-signed certificate for it.
+
+    Returns:
+        tuple: (path to certs.json, path to key.pem)
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=CERT_DAYS))
+        .sign(key, hashes.SHA256())
+    )
+
+    os.makedirs(directory, exist_ok=True)
+    certs_path = os.path.join(directory, "certs.json")
+    key_path = os.path.join(directory, "key.pem")
+    with open(certs_path, "w") as f:
+        json.dump({key_id: cert.public_bytes(serialization.Encoding.PEM).decode()}, f)
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ))
+    return certs_path, key_path
+
+
+def sign_token(key_path, project_id, uid, expires_in=3600, key_id=KEY_ID, **claims):
+    """
+    Sign an ID token the way Firebase Auth would, with the key from write_key_set.
+
+    Args:
+        key_path (str): Path to key.pem.
+        project_id (str): The Firebase project the token is for.
+        uid (str): The user's ID, the token's subject.
+        expires_in (int): Seconds until the token expires; negative for an expired one.
+        key_id (str): The key ID in the token's header.
+        **claims: Extra claims, e.g. email, or overrides of the standard ones.
+
+    Returns:
+        str: The encoded token.
+    """
+    with open(key_path, "rb") as f:
+        key = serialization.load_pem_private_key(f.read(), password=None)
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{project_id}",
+        "aud": project_id,
+        "sub": uid,
+        "user_id": uid,
+        "iat": now,
+        "auth_time": now,
+        "exp": now + expires_in,
+        **claims,
+    }
+    return jwt.encode(payload, key, algorithm="RS256", headers={"kid": key_id})
+
+
+if __name__ == "__main__":
+    certs_path, key_path = write_key_set(sys.argv[1] if len(sys.argv) > 1 else ".")
+    print(f"Wrote {certs_path} and {key_path}")
+    print(f"Start the app with FIREBASE_CERTS_FILE={os.path.abspath(certs_path)}")
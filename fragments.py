@@ -0,0 +1,37 @@
+import os
+from flask import render_template
+from markupsafe import Markup
+from response_cache import ResponseCache, make_key
+
+# Rendered HTML snippets kept per worker process. Keys include the versions
+# the snippet depends on (catalog version, user data version), so stale
+# entries are never looked up again and simply age out.
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", 4096))
+FRAGMENT_CACHE_TTL = 60 * 60
+
+_fragment_cache = ResponseCache("fragments", maxsize=FRAGMENT_CACHE_SIZE, ttl=FRAGMENT_CACHE_TTL)
+
+
+def render_fragment(template_name, key, **context):
+    """
+    Render a partial template, reusing the HTML from an earlier render with the same key.
+
+    Available in templates, e.g.:
+        {{ render_fragment('fragments/card_tile.html', (catalog_version, card.cardId), card=card) }}
+
+    Args:
+        template_name (str): The partial template to render.
+        key (tuple): Everything the output depends on besides the template.
+        **context: Variables for the template.
+    """
+    cache_key = make_key(template_name, *key)
+    html = _fragment_cache.get(cache_key)
+    if html is None:
+        html = render_template(template_name, **context)
+        _fragment_cache.set(cache_key, html)
+    return Markup(html)
+
+
+def clear_fragments():
+    """Drop every cached fragment in this process."""
+    _fragment_cache.clear()
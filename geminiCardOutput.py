@@ -2,7 +2,10 @@ import json
 import os
 import requests
 import textwrap
+import threading
+import gemini_client
 from database import Database
+from response_cache import ResponseCache, make_key, normalize_query
 
 # --- Configuration ---
 # IMPORTANT: Set your Gemini API key as an environment variable named 'GEMINI_API_KEY'
@@ -10,28 +13,23 @@ from database import Database
 # - Linux/macOS: export GEMINI_API_KEY='your_api_key_here'
 # - Windows: set GEMINI_API_KEY='your_api_key_here'
 # You can get an API key from Google AI Studio.
-API_KEY = os.getenv("GEMINI_API_KEY")
-API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={API_KEY}"
+API_KEY = gemini_client.API_KEY
 
-def find_best_card(card_list, user_query, fail_num=0, fail_max=5):
-    """
-    Uses the Gemini API to find the best card based on a user's query.
+# Recommendations are cached per normalized query and card catalog version.
+# Set RECOMMENDATION_CACHE_SHARED=0 to only cache inside each worker process.
+CACHE_TTL = int(os.getenv("RECOMMENDATION_CACHE_TTL", 24 * 60 * 60))
+CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", 512))
+CACHE_SHARED = os.getenv("RECOMMENDATION_CACHE_SHARED", "1") != "0"
+# How many locally pre-selected cards are sent to Gemini with each request.
+CANDIDATE_COUNT = int(os.getenv("RECOMMENDATION_CANDIDATES", 15))
 
-    Args:
-        card_list (list): The list of available credit cards.
-        user_query (str): The user's description of their desired card.
-        fail_num (int): The current number of failed attempts.
-        fail_max (int): The maximum number of fails allowed.
+_recommendation_cache = None
+_cache_lock = threading.Lock()
 
-    Returns:
-        dict: The dictionary of the recommended card, or None if an error occurs.
-    """
-    if not API_KEY:
-        print("Error: GEMINI_API_KEY environment variable not set.")
-        return None
-
-    # We serialize the list of cards into a JSON string to send to the model.
-    cards_json_string = json.dumps(card_list, indent=2)
+def build_prompt(card_list, user_query):
+    """Builds the prompt asking Gemini to pick the best card in card_list for user_query."""
+    # We serialize the list of cards into a compact JSON string to send to the model.
+    cards_json_string = json.dumps(card_list, separators=(',', ':'))
 
     # This prompt is engineered to get a clean JSON object as a response.
     prompt = textwrap.dedent(f"""
@@ -48,62 +46,65 @@ def find_best_card(card_list, user_query, fail_num=0, fail_max=5):
         Your response MUST be ONLY the JSON object of the recommended card from the list provided.
         Do not add any explanation, introduction, or markdown formatting.
     """)
+    return prompt
+
+def parse_card(card_text):
+    """
+    Parses the model's reply into a card dictionary.
 
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}]
-    }
+    Raises:
+        json.JSONDecodeError: If the reply is not valid JSON.
+    """
+    # --- FIX: Clean the response to remove markdown formatting ---
+    # The API sometimes returns the JSON wrapped in ```json ... ```
+    # This code finds the start and end of the JSON object to extract it.
+    if '```' in card_text:
+        start = card_text.find('{')
+        end = card_text.rfind('}') + 1
+        if start != -1 and end != 0:
+             card_text = card_text[start:end]
 
-    headers = {
-        'Content-Type': 'application/json'
-    }
-    
-    card_text = "" # Initialize card_text to be available in the final except block
-    try:
-        print("\nAsking Gemini to find the best card for you...")
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=60)
-        response.raise_for_status()  # Raises an exception for bad status codes (4xx or 5xx)
-
-        response_data = response.json()
-        
-        # Extract the text content from the API response
-        card_text = response_data['candidates'][0]['content']['parts'][0]['text']
-        
-        # --- FIX: Clean the response to remove markdown formatting ---
-        # The API sometimes returns the JSON wrapped in ```json ... ```
-        # This code finds the start and end of the JSON object to extract it.
-        if '```' in card_text:
-            start = card_text.find('{')
-            end = card_text.rfind('}') + 1
-            if start != -1 and end != 0:
-                 card_text = card_text[start:end]
-
-        # The model should return a clean JSON string, so we parse it.
-        recommended_card = json.loads(card_text)
-        return recommended_card
-
-    except requests.exceptions.RequestException as e:
-        print(f"An API error occurred: {e}")
-        fail_num += 1
-        print(f"Number of fails: {fail_num}")
-        if fail_num < fail_max:
-            return find_best_card(card_list, user_query, fail_num)
-        return None
-    except (KeyError, IndexError):
-        print("Error: Could not parse the response from the Gemini API.")
-        print("Raw response:", response.text)
-        fail_num += 1
-        print(f"Number of fails: {fail_num}")
-        if fail_num < fail_max:
-            return find_best_card(card_list, user_query, fail_num)
+    # The model should return a clean JSON string, so we parse it.
+    return json.loads(card_text)
+
+def find_best_card(card_list, user_query, fail_max=3):
+    """
+    Uses the Gemini API to find the best card based on a user's query.
+
+    Network errors, rate limits and server errors are retried inside
+    gemini_client; this only asks again when the reply cannot be parsed.
+
+    Args:
+        card_list (list): The list of available credit cards.
+        user_query (str): The user's description of their desired card.
+        fail_max (int): The maximum number of unparseable replies allowed.
+
+    Returns:
+        dict: The dictionary of the recommended card, or None if an error occurs.
+    """
+    if not API_KEY:
+        print("Error: GEMINI_API_KEY environment variable not set.")
         return None
-    except json.JSONDecodeError:
-        print("Error: Failed to decode the JSON response from the API.")
-        print("Received text:", card_text)
-        fail_num += 1
+
+    prompt = build_prompt(card_list, user_query)
+
+    for fail_num in range(1, fail_max + 1):
+        card_text = ""
+        try:
+            print("\nAsking Gemini to find the best card for you...")
+            card_text = gemini_client.generate(prompt, timeout=60)
+            return parse_card(card_text)
+        except requests.exceptions.RequestException as e:
+            # Already retried with backoff (or refused by the circuit breaker).
+            print(f"An API error occurred: {e}")
+            return None
+        except (KeyError, IndexError):
+            print("Error: Could not parse the response from the Gemini API.")
+        except json.JSONDecodeError:
+            print("Error: Failed to decode the JSON response from the API.")
+            print("Received text:", card_text)
         print(f"Number of fails: {fail_num}")
-        if fail_num < fail_max:
-            return find_best_card(card_list, user_query, fail_num)
-        return None
+    return None
 
 
 def format_card(card):
@@ -176,6 +177,7 @@ def format_card(card):
 def simplify(cards):
     """
     Removes unused data from the cards JSON.
+    Empty credit and offer lists are dropped to keep the prompt small.
 
     Args:
         cards (list): The list of available credit cards.
@@ -192,26 +194,104 @@ def simplify(cards):
         simple_card["annualFee"] = card["annualFee"]
         simple_card["universalCashbackPercent"] = card["universalCashbackPercent"]
         simple_card["url"] = card["url"]
-        simple_card["credits"] = card["credits"]
-        simple_card["offers"] = card["offers"]
+        if card["credits"]:
+            simple_card["credits"] = card["credits"]
+        if card["offers"]:
+            simple_card["offers"] = card["offers"]
         return_cards.append(simple_card)
     return return_cards
 
+def get_recommendation_cache(db):
+    """Return the shared recommendation cache, creating it on first use."""
+    global _recommendation_cache
+    with _cache_lock:
+        if _recommendation_cache is None:
+            _recommendation_cache = ResponseCache(
+                "recommendations",
+                maxsize=CACHE_SIZE,
+                ttl=CACHE_TTL,
+                db=db if CACHE_SHARED else None,
+            )
+        return _recommendation_cache
+
+def get_cached_recommendation(user_query, db):
+    """Return the cached recommendation for a query, or None if it has to be generated."""
+    cache = get_recommendation_cache(db)
+    cache.set_version(db.catalog.version)
+    return cache.get(make_key(normalize_query(user_query)))
+
 def get_recommended_card(user_query, db):
     """
     Main function to run the credit card parser program.
+    Identical (after normalization) queries against the same catalog are served from the cache.
     """
-    cards_verbose = db.get_cards()
-    cards = simplify(cards_verbose)
+    catalog = db.catalog
+    cache = get_recommendation_cache(db)
+    cache.set_version(catalog.version)  # a refreshed catalog invalidates old answers
+    key = make_key(normalize_query(user_query))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    cards = get_candidates(user_query, catalog)
     if not cards:
         return "Could not load credit card data."
     card = find_best_card(cards, user_query)
-    return format_card(card)
+    output = format_card(card)
+    if card:
+        cache.set(key, output)
+    return output
+
+def get_candidates(user_query, catalog):
+    """The simplified cards to send to Gemini for a query."""
+    # Only the most relevant cards go into the prompt, so its size depends on
+    # CANDIDATE_COUNT rather than on the size of the catalog.
+    return simplify(catalog.search_index.candidates(user_query, k=CANDIDATE_COUNT))
+
+def stream_recommended_card(user_query, db):
+    """
+    Streaming version of get_recommended_card, for background jobs.
+
+    Yields the model's raw reply as it is generated so the page can show
+    progress right away, and returns the formatted recommendation. If the
+    stream breaks off or the reply cannot be parsed, it falls back to
+    get_recommended_card; if the API call itself already used up its
+    retries (GeminiError), it does not try again.
+    """
+    cached = get_cached_recommendation(user_query, db)
+    if cached is not None:
+        return cached
+    if not API_KEY:
+        return get_recommended_card(user_query, db)
+
+    catalog = db.catalog
+    cards = get_candidates(user_query, catalog)
+    if not cards:
+        return "Could not load credit card data."
+
+    card_text = ""
+    try:
+        for piece in gemini_client.stream_generate(build_prompt(cards, user_query), timeout=60):
+            card_text += piece
+            yield piece
+        card = parse_card(card_text)
+    except gemini_client.GeminiError as e:
+        print(f"Streaming recommendation failed: {e}")
+        return format_card(None)
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+        print(f"Streaming recommendation failed: {e}")
+        return get_recommended_card(user_query, db)
+
+    output = format_card(card)
+    if card:
+        get_recommendation_cache(db).set(make_key(normalize_query(user_query)), output)
+    return output
 
 # Only run main if executed directly
 if __name__ == "__main__":
     print("--- Credit Card Finder powered by Gemini ---")
     db = Database()
+    db.refresh_catalog()
     cards = db.get_cards()
     if not cards:
         exit()
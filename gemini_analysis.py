@@ -1,63 +1,163 @@
-import json
 import os
 import requests
 import textwrap
+import threading
+import gemini_client
+from cachetools import LRUCache
+from rewards import analyze_spending, format_report
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={API_KEY}"
+API_KEY = gemini_client.API_KEY
 
-def get_spending_recommendations(user_cards, purchase_history):
+# Rough upper bound on the tokens of spending details added to the prompt.
+# Details are dropped in order of importance to stay under it.
+PROMPT_TOKEN_BUDGET = int(os.getenv("ANALYSIS_TOKEN_BUDGET", 600))
+# Months of per-month totals to include, most recent first.
+SUMMARY_MONTHS = 12
+
+# Phrased analyses, keyed by the prompt they were written from.
+_phrase_cache = LRUCache(maxsize=256)
+_phrase_lock = threading.Lock()
+
+def get_spending_recommendations(user_cards, summary):
     """
-    Uses the Gemini API to analyze spending patterns and recommend optimal card usage.
+    Recommends which of the user's cards to use for each spending category.
+
+    The recommendations are computed locally by the rewards engine; Gemini is
+    only used to phrase them. If the API key is missing or the call fails, the
+    locally formatted analysis is returned as is.
     """
-    if not API_KEY:
-        return "Error: GEMINI_API_KEY environment variable not set."
+    report = analyze_spending(user_cards, summary)
+    analysis = format_report(report)
+    if not API_KEY or not report["categories"]:
+        return analysis
+    return phrase_analysis(analysis, summarize_for_prompt(user_cards, summary))
 
-    # Convert the user's cards and purchase history to JSON strings
-    cards_json = json.dumps(user_cards, indent=2)
-    history_json = json.dumps(purchase_history, indent=2)
 
-    # This prompt is engineered to get a clear, markdown-formatted analysis.
-    prompt = textwrap.dedent(f"""
-        You are a financial analyst specializing in credit card rewards.
-        Your task is to analyze a user's spending history and their current credit cards to provide actionable recommendations for maximizing rewards.
+def stream_spending_recommendations(user_cards, summary):
+    """
+    Streaming version of get_spending_recommendations, for background jobs.
+
+    Yields the phrased analysis piece by piece as Gemini generates it, and
+    returns the complete text. Falls back to the local analysis if the API
+    key is missing or the stream fails; a stream cut off partway is replaced
+    by the local analysis rather than returned as if it were complete.
+    """
+    report = analyze_spending(user_cards, summary)
+    analysis = format_report(report)
+    if not API_KEY or not report["categories"]:
+        yield analysis
+        return analysis
+
+    prompt = build_phrase_prompt(analysis, summarize_for_prompt(user_cards, summary))
+    with _phrase_lock:
+        cached = _phrase_cache.get(prompt)
+    if cached is not None:
+        yield cached
+        return cached
+
+    text = ""
+    try:
+        for piece in gemini_client.stream_generate(prompt, timeout=90):
+            text += piece
+            yield piece
+    except requests.exceptions.RequestException as e:
+        print(f"An API error occurred: {e}")
+        if not text:
+            yield analysis
+        return analysis
+
+    with _phrase_lock:
+        _phrase_cache[prompt] = text
+    return text
 
-        Here is the list of the user's credit cards and their benefits:
-        {cards_json}
 
-        Here is the user's recent purchase history:
-        {history_json}
+def estimate_tokens(text):
+    """A rough token count for budgeting: about four characters per token."""
+    return len(text) // 4 + 1
 
-        Based on both lists, please provide a brief analysis and a set of recommendations. Structure your response in markdown format as follows:
 
-        **Spending Analysis:**
-        A one or two-sentence summary of the user's main spending categories (e.g., "Your top spending categories are Grocery and Food & Dining.").
+def summarize_for_prompt(user_cards, summary, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Condense the user's cards and spending summary into a few lines of prompt context.
+
+    Lines are added in order of importance (the cards, each category's total,
+    recent months, then top merchants) until the token budget is used up, so
+    the prompt stays the same size however long the history is.
+    """
+    cards = "; ".join(
+        f"{card['name']} ({card.get('universalCashbackPercent') or 0}% {card.get('currency')}, "
+        f"${card.get('annualFee') or 0} annual fee)"
+        for card in user_cards
+    )
+    candidates = [("cards", f"Cards: {cards}")]
+    for category, total, count, merchants in summary["categories"]:
+        candidates.append((category, f"- {category}: ${total:,.2f} over {count} purchase(s)"))
+    for month, total, count in summary["months"][::-1][:SUMMARY_MONTHS]:
+        candidates.append(("months", f"{month}: ${total:,.2f} ({count})"))
+    for category, total, count, merchants in summary["categories"]:
+        if merchants:
+            top = ", ".join(f"{name} (${amount:,.2f})" for name, amount, _ in merchants)
+            candidates.append((category, f"  top merchants: {top}"))
+
+    used = 0
+    kept = []
+    for section, line in candidates:
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            continue
+        used += cost
+        kept.append((section, line))
+
+    # Render in reading order: cards, then categories with their merchants, then months.
+    lines = [line for section, line in kept if section == "cards"]
+    for category, total, count, merchants in summary["categories"]:
+        lines.extend(line for section, line in kept if section == category)
+    months = sorted(line for section, line in kept if section == "months")
+    if months:
+        lines.append("Spending by month: " + "; ".join(months))
+    return "\n".join(lines)
+
 
-        **Card Recommendations:**
-        Create a bulleted list. For each major spending category from the user's history, recommend which of their cards would have been the best to use and briefly explain why.
-        For example:
-        - **Grocery**: Use your 'Amex Gold' card to earn 4x points on all grocery purchases.
-        - **Subscriptions**: Your 'Chase Freedom Unlimited' would be best here for its flat 1.5% cash back.
+def build_phrase_prompt(analysis, details=""):
+    """Builds the prompt asking Gemini to reword a computed analysis, with optional spending details."""
+    # This prompt is engineered to keep the markdown structure the dashboard parses.
+    return textwrap.dedent(f"""
+        You are a financial analyst specializing in credit card rewards.
+        Below is an analysis of a user's spending and which of their cards earns the most in each category.
+        The numbers have already been calculated; do not change any card names, categories or amounts.
+
+        {analysis}
 
-        **Missed Opportunities:**
-        If you spot any clear missed opportunities, mention one or two. For example: "You spent a lot on travel using a low-reward card; your 'Chase Sapphire' would have earned significantly more."
+        For context, here is a summary of the user's cards and spending:
+        {details}
 
-        Keep the entire response concise and easy to read.
+        Rewrite it to be friendly and easy to read, keeping exactly the same structure:
+        a **Spending Analysis:** section, a **Card Recommendations:** section with one bulleted
+        line per category in the form "* **Category**: recommendation", and a **Missed Opportunities:** section.
+        Keep the entire response concise.
     """)
 
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    headers = {'Content-Type': 'application/json'}
-    
+
+def phrase_analysis(analysis, details=""):
+    """
+    Asks Gemini to reword a computed analysis in a friendlier tone.
+    Results are cached, so identical prompts only cost one API call.
+    """
+    prompt = build_phrase_prompt(analysis, details)
+    with _phrase_lock:
+        cached = _phrase_cache.get(prompt)
+    if cached is not None:
+        return cached
+
     try:
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=90)
-        response.raise_for_status()
-        response_data = response.json()
-        
-        # Extract the markdown text content from the API response
-        analysis_text = response_data['candidates'][0]['content']['parts'][0]['text']
+        analysis_text = gemini_client.generate(prompt, timeout=90)
+        with _phrase_lock:
+            _phrase_cache[prompt] = analysis_text
         return analysis_text
 
     except requests.exceptions.RequestException as e:
-        return f"An API error occurred: {e}"
+        print(f"An API error occurred: {e}")
+        return analysis
     except (KeyError, IndexError):
-        return "Error: Could not parse the response from the Gemini API."
\ No newline at end of file
+        print("Error: Could not parse the response from the Gemini API.")
+        return analysis
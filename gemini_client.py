@@ -0,0 +1,236 @@
+import json
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# IMPORTANT: Set your Gemini API key as an environment variable named 'GEMINI_API_KEY'.
+# GEMINI_API_BASE can point at a local stub server for testing (see gemini_stub.py).
+API_KEY = os.getenv("GEMINI_API_KEY")
+API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+# Attempts per call (the first try plus retries) for errors worth retrying.
+MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", 3))
+# Exponential backoff: a random delay up to BACKOFF_BASE * 2**attempt, capped at BACKOFF_MAX.
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 20.0
+# Calls allowed in flight at once per worker process, and how long to wait for a slot.
+MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 4))
+QUEUE_TIMEOUT = 30
+# After this many failed calls in a row, fail fast for BREAKER_COOLDOWN seconds.
+BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN = int(os.getenv("GEMINI_BREAKER_COOLDOWN", 60))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GeminiError(requests.exceptions.RequestException):
+    """Raised when a Gemini call fails after all retries."""
+
+
+class GeminiUnavailable(GeminiError):
+    """Raised without calling the API when it is known to be down or too busy."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service for a while.
+
+    After 'threshold' consecutive failures the breaker opens and every call
+    fails fast for 'cooldown' seconds. Then a single trial call is let through:
+    success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go ahead right now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def release_trial(self):
+        """End a trial call that neither proved nor disproved the service is up."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+_breaker = CircuitBreaker()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """A shared requests.Session, so connections to the API are kept alive and reused."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENCY)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def endpoint(method):
+    """The URL of a model method, e.g. 'generateContent' or 'streamGenerateContent'."""
+    return f"{API_BASE}/models/{MODEL}:{method}?key={API_KEY}"
+
+
+def extract_text(response_data):
+    """Pull the generated text out of a (possibly partial) Gemini response."""
+    parts = response_data['candidates'][0]['content']['parts']
+    return "".join(part.get('text', '') for part in parts)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    How long to wait before retry number 'attempt' (starting at 0).
+
+    Uses "full jitter" so many workers retrying at once spread out, and never
+    waits less than the server's Retry-After, even past BACKOFF_MAX.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+def _post(url, payload, timeout, stream=False):
+    """
+    POST to the API with retries, the concurrency limit and the circuit breaker.
+
+    The caller must release the returned response's concurrency slot by calling
+    _release() once done with it.
+    """
+    if not API_KEY:
+        raise GeminiError("GEMINI_API_KEY environment variable not set.")
+    headers = {'Content-Type': 'application/json'}
+
+    last_error = None
+    for attempt in range(MAX_ATTEMPTS):
+        # Take a slot before asking the breaker, so a half-open breaker's
+        # trial call is never started and then abandoned waiting for a slot.
+        if not _slots.acquire(timeout=QUEUE_TIMEOUT):
+            raise GeminiUnavailable("Too many requests to the Gemini API right now. Please try again shortly.")
+        if not _breaker.allow():
+            _slots.release()
+            raise GeminiUnavailable("The Gemini API is unavailable right now. Please try again shortly.")
+
+        retry_after = None
+        try:
+            response = get_session().post(url, headers=headers, json=payload, timeout=timeout, stream=stream)
+            if response.status_code not in RETRY_STATUSES:
+                # Any other answer, even a 4xx, shows the service is reachable.
+                _breaker.record_success()
+                try:
+                    response.raise_for_status()
+                except requests.exceptions.HTTPError:
+                    response.close()
+                    raise
+                return response
+            retry_after = response.headers.get("Retry-After")
+            last_error = GeminiError(f"Gemini API returned {response.status_code}")
+            response.close()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            last_error = e
+        except requests.exceptions.RequestException:
+            # Other errors (e.g. 400 for a bad request) will not get better by retrying.
+            _breaker.release_trial()
+            _slots.release()
+            raise
+        _slots.release()
+        _breaker.record_failure()
+
+        if attempt + 1 < MAX_ATTEMPTS:
+            delay = backoff_delay(attempt, retry_after)
+            if delay > BACKOFF_MAX:
+                # The server asked for a longer pause than a request should wait.
+                raise GeminiUnavailable(
+                    f"The Gemini API asked us to wait {delay:.0f}s before retrying. Please try again later."
+                )
+            print(f"Gemini call failed ({last_error}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    raise GeminiError(f"Gemini API call failed after {MAX_ATTEMPTS} attempts: {last_error}")
+
+
+def _release():
+    _slots.release()
+
+
+def generate(prompt, timeout=60):
+    """
+    Generate text for a prompt.
+
+    Raises:
+        requests.exceptions.RequestException: If the call fails after retries
+        (GeminiError) or is refused without trying (GeminiUnavailable).
+        KeyError, IndexError: If the response is not in the expected format.
+    """
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    response = _post(endpoint("generateContent"), payload, timeout)
+    try:
+        return extract_text(response.json())
+    finally:
+        _release()
+
+
+def stream_generate(prompt, timeout=90):
+    """
+    Generate text for a prompt with Gemini's streaming endpoint.
+
+    Retries only happen before the first piece is produced.
+
+    Yields:
+        str: Pieces of the response as soon as the model produces them.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails.
+    """
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    response = _post(endpoint("streamGenerateContent") + "&alt=sse", payload, timeout, stream=True)
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            # Server-sent events: each chunk is a 'data: {json}' line.
+            if not line or not line.startswith("data:"):
+                continue
+            try:
+                text = extract_text(json.loads(line[len("data:"):]))
+            except (ValueError, KeyError, IndexError):
+                continue
+            if text:
+                yield text
+    finally:
+        response.close()
+        _release()
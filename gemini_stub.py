@@ -0,0 +1,80 @@
+"""
+A tiny stand-in for the Gemini API, for trying the app without a real key.
+
+Run it with:
+    python gemini_stub.py [port]
+and start the app with:
+    GEMINI_API_KEY=stub GEMINI_API_BASE=http://127.0.0.1:8089/v1beta
+
+generateContent returns a canned reply in one response; streamGenerateContent
+sends the same reply a few words at a time as server-sent events, with a short
+delay between them. Prompts asking for a card's JSON get the first card found
+in the prompt back.
+"""
+import json
+import re
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK_DELAY = 0.05
+
+ANALYSIS_REPLY = """**Spending Analysis:**
+This is a stubbed analysis of your spending.
+
+**Card Recommendations:**
+* **Everything**: Use whichever card the stub server likes best.
+
+**Missed Opportunities:**
+None, this is only a test."""
+
+
+def reply_for(prompt):
+    """Pick a canned reply: a card from the prompt's JSON list, or the stub analysis."""
+    start = prompt.find("[{")
+    if "JSON object of the recommended card" in prompt and start != -1:
+        try:
+            cards, _ = json.JSONDecoder().raw_decode(prompt, start)
+            return json.dumps(cards[0])
+        except (ValueError, IndexError):
+            pass
+    return ANALYSIS_REPLY
+
+
+def response_body(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            prompt = json.loads(self.rfile.read(length))["contents"][0]["parts"][0]["text"]
+        except (ValueError, KeyError, IndexError):
+            self.send_error(400)
+            return
+        reply = reply_for(prompt)
+
+        if ":streamGenerateContent" in self.path:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for piece in re.findall(r"\S+\s*", reply):
+                self.wfile.write(f"data: {json.dumps(response_body(piece))}\r\n\r\n".encode())
+                self.wfile.flush()
+                time.sleep(CHUNK_DELAY)
+        elif ":generateContent" in self.path:
+            body = json.dumps(response_body(reply)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8089
+    print(f"Gemini stub listening on http://127.0.0.1:{port}/v1beta")
+    ThreadingHTTPServer(("127.0.0.1", port), StubHandler).serve_forever()
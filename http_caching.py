@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import os
+from datetime import datetime, timezone
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses fall back to gzip.
+    brotli = None
+
+# Fingerprinted static files never change under the same URL, so browsers may keep them for a year.
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+# Only these types are compressed; images are already compressed, and
+# server-sent event streams must reach the browser unbuffered.
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/css", "text/plain", "text/javascript",
+    "application/json", "application/javascript", "image/svg+xml",
+}
+# Responses smaller than this are not worth compressing.
+MIN_COMPRESS_BYTES = 500
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_fingerprints = {}  # static filename -> (mtime, fingerprint)
+_build = None  # (hash, newest mtime) of the app's templates and static files
+
+
+def static_fingerprint(static_folder, filename):
+    """A short hash of a static file's contents, recomputed only when the file changes."""
+    path = os.path.join(static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _fingerprints.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, "rb") as f:
+        fingerprint = hashlib.md5(f.read()).hexdigest()[:12]
+    _fingerprints[filename] = (mtime, fingerprint)
+    return fingerprint
+
+
+def build_version(app):
+    """
+    A hash of the app's templates and static files, and when the newest of them changed.
+
+    Pages whose validators only follow their data add this, so a deploy
+    that changes how they look is not answered with a 304 for the old
+    page. It is worked out once per process; every worker of a deploy
+    gets the same value.
+
+    Returns:
+        tuple: (short hash, UNIX time)
+    """
+    global _build
+    if _build is None:
+        digest = hashlib.md5()
+        newest = 0.0
+        folders = [os.path.join(app.root_path, app.template_folder or ""), app.static_folder]
+        for folder in filter(None, folders):
+            for root, dirs, files in os.walk(folder):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    digest.update(os.path.relpath(path, folder).encode())
+                    with open(path, "rb") as f:
+                        digest.update(f.read())
+                    newest = max(newest, os.path.getmtime(path))
+        _build = (digest.hexdigest()[:12], newest)
+    return _build
+
+
+def is_not_modified(etag, last_modified=None):
+    """
+    Check the request's conditional headers against a page's validators.
+
+    Call this before rendering, so a browser that already has the page
+    costs neither the render nor the bytes.
+
+    Args:
+        etag (str): The page's (weak) entity tag, without quotes.
+        last_modified (float): UNIX time the page's data last changed.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return request.if_modified_since >= datetime.fromtimestamp(int(last_modified), timezone.utc)
+    return False
+
+
+def set_validators(response, etag, last_modified=None):
+    """Add ETag, Last-Modified and a revalidate-every-time Cache-Control to a response."""
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = datetime.fromtimestamp(int(last_modified), timezone.utc)
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified_response(etag, last_modified=None):
+    """An empty 304 response carrying the page's validators."""
+    return set_validators(Response(status=304), etag, last_modified)
+
+
+def compress_response(response):
+    """Compress a response body with brotli or gzip, if the client accepts it and it is worth it."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def init_http_caching(app):
+    """
+    Set up response compression and fingerprinted static URLs for an app.
+
+    url_for('static', ...) gains a 'v' parameter holding a hash of the file,
+    and static files requested with it are served with far-future caching,
+    so a changed file is picked up through its new URL.
+    """
+
+    @app.url_defaults
+    def add_static_fingerprint(endpoint, values):
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            fingerprint = static_fingerprint(app.static_folder, values["filename"])
+            if fingerprint:
+                values["v"] = fingerprint
+
+    @app.after_request
+    def add_caching_headers(response):
+        if request.endpoint == "static" and request.args.get("v") and response.status_code in (200, 304):
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+            return response
+        return compress_response(response)
@@ -0,0 +1,140 @@
+import io
+import os
+from collections import Counter
+from categorizer import Categorizer
+
+# Rows parsed and inserted per chunk; bounds memory regardless of file size.
+CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", 5000))
+# Largest statement we accept, in bytes.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", 50)) * 1024 * 1024
+
+REQUIRED_COLUMNS = ("Date", "Amount")
+COLUMNS = ("Date", "Description", "Amount", "Category")
+# Everything is read as text and converted explicitly, so a stray value
+# cannot silently change a column's type between chunks.
+COLUMN_DTYPES = {column: str for column in COLUMNS}
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload is bigger than the configured maximum."""
+
+
+class _CountingReader(io.RawIOBase):
+    """Wraps a binary stream, counting bytes read and enforcing a size limit."""
+
+    def __init__(self, stream, max_bytes):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        self.bytes_read += len(data)
+        if self.max_bytes and self.bytes_read > self.max_bytes:
+            raise UploadTooLarge(f"File is larger than the {self.max_bytes:,} byte limit.")
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def normalize_chunk(chunk):
+    """
+    Convert a chunk of raw CSV text columns into clean transaction rows.
+
+    Dates become 'YYYY-MM-DD' strings, amounts become floats (accepting '$'
+    and thousands separators), and blank categories become None. Rows without
+    a usable amount are dropped.
+
+    Returns:
+        list: The rows as dicts with 'Date', 'Description', 'Amount' and 'Category' keys.
+    """
+    import pandas as pd
+
+    for column in COLUMNS:
+        if column not in chunk.columns:
+            chunk[column] = None
+
+    # Parse the common ISO format in one vectorized pass, then fall back to
+    # per-value parsing only for the rows that did not match it.
+    dates = pd.to_datetime(chunk["Date"], format="%Y-%m-%d", errors="coerce")
+    unparsed = dates.isna() & chunk["Date"].notna()
+    if unparsed.any():
+        dates[unparsed] = pd.to_datetime(chunk["Date"][unparsed], format="mixed", errors="coerce")
+    amounts = pd.to_numeric(
+        chunk["Amount"].astype(str).str.replace(r"[$,\s]", "", regex=True),
+        errors="coerce",
+    )
+    descriptions = chunk["Description"].astype(object).where(chunk["Description"].notna(), None)
+    categories = chunk["Category"].astype(object).where(chunk["Category"].notna(), None)
+
+    valid = amounts.notna()
+    date_strings = dates.dt.strftime("%Y-%m-%d")
+
+    rows = []
+    for date, description, amount, category in zip(
+        date_strings[valid], descriptions[valid], amounts[valid], categories[valid]
+    ):
+        if isinstance(category, str):
+            category = category.strip() or None
+        rows.append({
+            "Date": date if isinstance(date, str) else None,
+            "Description": description,
+            "Amount": float(amount),
+            "Category": category,
+        })
+    return rows
+
+
+def ingest_csv(stream, db, user_id, statement_id, chunk_rows=CHUNK_ROWS,
+               max_bytes=MAX_UPLOAD_BYTES, progress=None):
+    """
+    Parse a CSV statement from a binary stream in chunks and store it.
+
+    Each chunk is normalized and bulk-inserted before the next one is read,
+    so only one chunk is ever held in memory. Transactions the user already
+    has (e.g. from an overlapping export) are skipped. Missing categories are
+    filled in from the description, and the user's category overrides are
+    applied (see categorizer.Categorizer).
+
+    Args:
+        stream: A binary file-like object, e.g. an uploaded file's stream.
+        db (Database): Where the transactions are stored.
+        user_id (str): The owner of the statement.
+        statement_id (int): The statement the rows belong to.
+        chunk_rows (int): The number of CSV rows to parse at a time.
+        max_bytes (int): The largest stream accepted, or 0 for no limit.
+        progress (callable): Optional, called as progress(rows_stored, bytes_read) after every chunk.
+
+    Returns:
+        tuple: (new transactions stored, duplicate transactions skipped)
+    """
+    # pandas is slow to import, so it is only loaded once a statement is uploaded.
+    import pandas as pd
+
+    reader = _CountingReader(stream, max_bytes)
+    chunks = pd.read_csv(
+        io.BufferedReader(reader),
+        chunksize=chunk_rows,
+        dtype=COLUMN_DTYPES,
+        usecols=lambda column: column in COLUMNS,
+        encoding="utf-8-sig",
+        encoding_errors="replace",
+        skipinitialspace=True,
+    )
+
+    categorizer = Categorizer(db.get_category_overrides(user_id))
+    seen = Counter()
+    stored = duplicates = 0
+    for chunk in chunks:
+        missing = [column for column in REQUIRED_COLUMNS if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+        rows = categorizer.categorize_rows(normalize_chunk(chunk))
+        new_rows = db.add_transactions(user_id, statement_id, rows, seen=seen)
+        stored += new_rows
+        duplicates += len(rows) - new_rows
+        if progress:
+            progress(stored, reader.bytes_read)
+    return stored, duplicates
@@ -0,0 +1,106 @@
+import inspect
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads per worker process that run slow jobs such as Gemini calls.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+# A job still queued or running after this many seconds is reported as failed
+# (e.g. because the worker process that owned it was restarted).
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", 5 * 60))
+# Finished jobs are deleted after this many seconds.
+JOB_RETENTION = 24 * 60 * 60
+# How often (in seconds) a streaming job saves its partial output.
+PARTIAL_SAVE_INTERVAL = 0.2
+
+
+class JobQueue:
+    """
+    Runs slow functions in a background thread pool so request handlers can return right away.
+
+    Job state and results are stored in the database, so a status request can
+    be answered by any gunicorn worker, not just the one running the job.
+    """
+
+    def __init__(self, db, max_workers=JOB_WORKERS):
+        self.db = db
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Threads do not survive a fork, so each worker process gets its own pool.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, user_id, kind, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) to run in the background.
+
+        The function's return value (a string) becomes the job's result. If
+        func is a generator, each string it yields is appended to the job's
+        partial output as it arrives, and its return value (or, if it returns
+        nothing, everything it yielded) becomes the result.
+
+        Returns:
+            str: The job ID to poll with get().
+        """
+        job_id = uuid.uuid4().hex
+        self.db.add_job(job_id, user_id, kind)
+        self.db.purge_jobs(JOB_RETENTION)
+        self._get_executor().submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        self.db.update_job(job_id, "running")
+        try:
+            result = func(*args, **kwargs)
+            if inspect.isgenerator(result):
+                result = self._consume(job_id, result)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.db.update_job(job_id, "failed", error=str(e))
+        else:
+            self.db.update_job(job_id, "done", result=result)
+
+    def _consume(self, job_id, generator):
+        # Save partial output at most every PARTIAL_SAVE_INTERVAL seconds so
+        # streaming does not turn into a database write per token.
+        partial = ""
+        last_save = 0.0
+        while True:
+            try:
+                piece = next(generator)
+            except StopIteration as stop:
+                if partial:
+                    self.db.update_job_partial(job_id, partial)
+                return stop.value if stop.value is not None else partial
+            partial += piece
+            now = time.monotonic()
+            if now - last_save >= PARTIAL_SAVE_INTERVAL:
+                self.db.update_job_partial(job_id, partial)
+                last_save = now
+
+    def get(self, job_id, user_id):
+        """
+        Look up a user's job.
+
+        Returns:
+            dict: 'id', 'kind', 'status' ('queued', 'running', 'done' or 'failed'),
+            'result', 'error' and 'partial' (output streamed so far),
+            or None if the job does not exist.
+        """
+        job = self.db.get_job(job_id, user_id)
+        if job is None:
+            return None
+        job = dict(job)
+        if job["status"] in ("queued", "running") and job["age"] > JOB_TIMEOUT:
+            job["status"] = "failed"
+            job["error"] = "The request timed out. Please try again."
+        return {key: job[key] for key in ("id", "kind", "status", "result", "error", "partial")}
@@ -0,0 +1,73 @@
+import hashlib
+import re
+import threading
+import time
+from cachetools import TTLCache
+
+
+def normalize_query(text):
+    """Lower-case a free-text query and drop punctuation and extra whitespace."""
+    words = re.findall(r"[a-z0-9$%]+", (text or "").lower())
+    return " ".join(words)
+
+
+def make_key(*parts):
+    """Build a fixed-length cache key from any number of string parts."""
+    raw = "\x1f".join(str(part) for part in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    A bounded, TTL-based cache for slow responses (e.g. Gemini calls).
+
+    Lookups go to an in-process LRU first and then, if a Database is given, to
+    a SQLite table shared by every gunicorn worker. Each cache is tied to a
+    version (such as the card catalog version): when the version changes,
+    both tiers drop their entries.
+    """
+
+    def __init__(self, namespace, maxsize=512, ttl=24 * 60 * 60, db=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.db = db
+        self.version = None
+        self._local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def set_version(self, version):
+        """Drop every entry if the version is different from the last one seen."""
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._local.clear()
+        if self.db is not None:
+            self.db.purge_cached_responses(self.namespace, keep_version=version)
+
+    def get(self, key):
+        """Return the cached value for a key, or None."""
+        with self._lock:
+            value = self._local.get(key)
+        if value is not None or self.db is None:
+            return value
+
+        value = self.db.get_cached_response(self.namespace, key, self.version)
+        if value is not None:
+            with self._lock:
+                self._local[key] = value
+        return value
+
+    def set(self, key, value):
+        """Store a value in both tiers."""
+        with self._lock:
+            self._local[key] = value
+        if self.db is not None:
+            self.db.set_cached_response(self.namespace, key, self.version, value, time.time() + self.ttl)
+
+    def clear(self):
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._local.clear()
+        if self.db is not None:
+            self.db.purge_cached_responses(self.namespace)
@@ -0,0 +1,239 @@
+from collections import defaultdict
+
+# Rough value of one point/mile in cents for each rewards currency in the
+# catalog. 'USD' cards earn cash, so one "point" is one cent. Anything not
+# listed is valued at DEFAULT_POINT_VALUE.
+POINT_VALUES = {
+    "USD": 1.0,
+    "AMERICAN_EXPRESS": 1.2,
+    "CHASE": 1.25,
+    "CAPITAL_ONE": 1.0,
+    "CITI": 1.0,
+    "BANK_OF_AMERICA": 1.0,
+    "US_BANK": 1.0,
+    "WELLS_FARGO": 1.0,
+    "BREX": 1.0,
+    "PENFED": 1.0,
+    "DELTA": 1.1,
+    "UNITED": 1.2,
+    "AMERICAN": 1.3,
+    "SOUTHWEST": 1.3,
+    "ALASKA": 1.4,
+    "JETBLUE": 1.3,
+    "HAWAIIAN": 1.0,
+    "SPIRIT": 0.8,
+    "FRONTIER": 0.8,
+    "BREEZE": 1.0,
+    "AVIOS": 1.3,
+    "FLYING_BLUE": 1.2,
+    "AEROPLAN": 1.3,
+    "AVIANCA": 1.1,
+    "LATAM": 1.0,
+    "KOREAN": 1.4,
+    "EMIRATES": 1.0,
+    "LUFTHANSA": 1.1,
+    "ANA": 1.4,
+    "CATHAY_PACIFIC": 1.2,
+    "VIRGIN": 1.3,
+    "AMTRAK": 2.0,
+    "MARRIOTT": 0.7,
+    "HILTON": 0.5,
+    "IHG": 0.5,
+    "HYATT": 1.7,
+    "WYNDHAM": 0.9,
+    "CHOICE": 0.6,
+    "BEST_WESTERN": 0.6,
+    "CARNIVAL": 1.0,
+    "EXPEDIA": 0.7,
+}
+DEFAULT_POINT_VALUE = 1.0
+
+# Keywords in a card credit's description and the spending categories the
+# credit can be used against.
+CREDIT_CATEGORIES = {
+    "uber": ("Transportation", "Travel", "Food & Drink"),
+    "lyft": ("Transportation",),
+    "dining": ("Food & Drink", "Dining"),
+    "restaurant": ("Food & Drink", "Dining"),
+    "grubhub": ("Food & Drink", "Dining"),
+    "doordash": ("Food & Drink", "Dining"),
+    "entertainment": ("Entertainment", "Subscriptions"),
+    "disney": ("Entertainment", "Subscriptions"),
+    "streaming": ("Entertainment", "Subscriptions"),
+    "walmart": ("Shopping", "Groceries"),
+    "hotel": ("Travel",),
+    "airline": ("Travel",),
+    "travel": ("Travel",),
+    "flight": ("Travel",),
+    "bag": ("Travel",),
+}
+
+
+def point_value(currency):
+    """The value in cents of one point of a rewards currency."""
+    return POINT_VALUES.get(currency, DEFAULT_POINT_VALUE)
+
+
+def dollar_value(amount, currency):
+    """The dollar value of an amount of a rewards currency; 'USD' amounts are already dollars."""
+    if currency == "USD":
+        return amount
+    return amount * point_value(currency) / 100
+
+
+def earn_rate(card):
+    """The dollars of value a card earns per dollar spent, e.g. 0.02 for 2% cash back."""
+    rate = card.get("universalCashbackPercent") or 0
+    return rate * point_value(card.get("currency")) / 100
+
+
+def category_spend(summary):
+    """
+    Total the spending per category in a spending summary.
+
+    Args:
+        summary (dict): A summary from Database.get_spending_summary.
+
+    Returns:
+        tuple: (dict of category -> dollars spent, number of months covered)
+    """
+    spend = {category: total for category, total, count, merchants in summary["categories"]}
+    return spend, max(len(summary["months"]), 1)
+
+
+def rollup_spend(monthly_totals):
+    """
+    Total the spending per category from the rollups.
+
+    Args:
+        monthly_totals (list): Rows from Database.get_monthly_totals.
+
+    Returns:
+        tuple: (dict of category -> dollars spent, number of months covered)
+    """
+    net = defaultdict(float)
+    months = set()
+    for month, category, total, count in monthly_totals:
+        net[category or "Uncategorized"] += total
+        if month:
+            months.add(month)
+    spend = {category: -total for category, total in net.items() if total < 0}
+    return spend, max(len(months), 1)
+
+
+def best_cards_by_category(cards, spend_by_category, months=12, matrix=None):
+    """
+    Work out which card earns the most for each spending category.
+
+    Each card's value for a category is what its earn rate returns on the
+    spending, plus any credits that apply to that category, prorated to the
+    number of months the spending covers and capped at the spending itself
+    (see simulator.CardMatrix.category_values).
+
+    Args:
+        cards (list): The cards to compare, in catalog format.
+        spend_by_category (dict): Dollars spent per category.
+        months (int): How many months the spending covers.
+        matrix (CardMatrix): The cards, already compiled; built from 'cards' if not given.
+
+    Returns:
+        list: One dict per category, biggest spend first, with 'category', 'spend',
+        'best_card', 'best_value' and 'values' (card name -> dollars) keys.
+    """
+    from simulator import CardMatrix
+
+    matrix = matrix or CardMatrix(cards)
+    categories, card_values = matrix.category_values(spend_by_category, months)
+    results = []
+    for column in sorted(range(len(categories)), key=lambda column: -spend_by_category[categories[column]]):
+        category = categories[column]
+        values = {
+            card["name"]: round(float(value), 2)
+            for card, value in zip(matrix.cards, card_values[:, column].tolist())
+        }
+        best_card = max(values, key=values.get) if values else None
+        results.append({
+            "category": category,
+            "spend": round(spend_by_category[category], 2),
+            "best_card": best_card,
+            "best_value": values.get(best_card, 0.0),
+            "values": values,
+        })
+    return results
+
+
+def analyze_spending(cards, summary):
+    """
+    Compute a full rewards report for a user's cards and spending summary.
+
+    Returns:
+        dict: 'categories' (see best_cards_by_category), 'months', 'total_spend',
+        'best_total' (value using the best card everywhere), 'cards' (each card's
+        projected yearly value after its annual fee and a reachable welcome
+        offer, best first; see simulator.CardMatrix.rank), and 'single_card' /
+        'single_card_total' (the best of those cards to use for everything, and
+        what it earns on the spending).
+    """
+    from simulator import CardMatrix
+
+    spend_by_category, months = category_spend(summary)
+    matrix = CardMatrix(cards)
+    categories = best_cards_by_category(cards, spend_by_category, months, matrix=matrix)
+    ranking = matrix.rank(spend_by_category, months)
+
+    card_totals = defaultdict(float)
+    for result in categories:
+        for name, value in result["values"].items():
+            card_totals[name] += value
+    single_card = ranking[0]["name"] if ranking else None
+
+    return {
+        "categories": categories,
+        "months": months,
+        "total_spend": round(sum(spend_by_category.values()), 2),
+        "best_total": round(sum(result["best_value"] for result in categories), 2),
+        "cards": ranking,
+        "single_card": single_card,
+        "single_card_total": round(card_totals.get(single_card, 0.0), 2),
+    }
+
+
+def format_report(report):
+    """
+    Render a rewards report as markdown, in the same sections the dashboard
+    expects from the Gemini analysis.
+    """
+    categories = report["categories"]
+    if not categories:
+        return "**Spending Analysis:**\nNo spending found in your uploaded statements."
+
+    top = [result["category"] for result in categories[:2]]
+    lines = ["**Spending Analysis:**"]
+    lines.append(
+        f"You spent ${report['total_spend']:,.2f} over {report['months']} month(s); "
+        f"your top spending categories are {' and '.join(top)}."
+    )
+    lines.append("")
+    lines.append("**Card Recommendations:**")
+    for result in categories:
+        lines.append(
+            f"* **{result['category']}**: Use your '{result['best_card']}' to earn about "
+            f"${result['best_value']:,.2f} on ${result['spend']:,.2f} of spending."
+        )
+    lines.append("")
+    lines.append("**Missed Opportunities:**")
+    difference = report["best_total"] - report["single_card_total"]
+    if difference >= 0.01:
+        lines.append(
+            f"Using the best card in each category earns about ${report['best_total']:,.2f}, "
+            f"${difference:,.2f} more than putting everything on your '{report['single_card']}'."
+        )
+    else:
+        lines.append(f"Your '{report['single_card']}' is the best choice for all of your spending.")
+    for card in report.get("cards", []):
+        if card["fee"] and card["net_value"] < 0:
+            lines.append(
+                f"Your '{card['name']}' costs ${card['fee']:,.2f} a year but only returns about "
+                f"${card['fee'] + card['net_value']:,.2f} on a year of spending like yours."
+            )
+    return "\n".join(lines)
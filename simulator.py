@@ -0,0 +1,211 @@
+import threading
+from rewards import CREDIT_CATEGORIES, dollar_value, earn_rate
+
+# Used to turn a welcome offer's time limit into the spending a user would
+# put on the card in that time.
+DAYS_PER_MONTH = 365 / 12
+# How many cards the dashboard shows.
+DASHBOARD_CARDS = 5
+
+_matrix = None
+_matrix_lock = threading.Lock()
+
+
+class CardMatrix:
+    """
+    The catalog's cards as NumPy arrays, so a user's spending is valued
+    against every card in a handful of array operations.
+
+    Built once per catalog version; see card_matrix.
+
+    Attributes:
+        earn_rates: Dollars earned per dollar spent, per card.
+        fees: Annual fee per card, 0 where the fee is waived.
+        fixed_credits: Yearly value of credits that do not depend on what the user buys.
+        category_credits: (cards x credit groups) yearly value of credits that can
+            only be used on the categories in credit_groups[group].
+        offer_cards, offer_spend, offer_days, offer_values: One entry per welcome offer.
+    """
+
+    def __init__(self, cards, version=None):
+        import numpy as np
+
+        self.version = version
+        self.cards = [
+            {"cardId": card["cardId"], "name": card["name"], "issuer": card.get("issuer"), "url": card.get("url")}
+            for card in cards
+        ]
+        self.earn_rates = np.array([earn_rate(card) for card in cards], dtype=float)
+        self.fees = np.array([
+            0.0 if card.get("isAnnualFeeWaived") else float(card.get("annualFee") or 0)
+            for card in cards
+        ])
+
+        fixed_credits = np.zeros(len(cards))
+        groups = {}  # tuple of categories -> column
+        grouped = []  # (card index, column, value)
+        offer_cards, offer_spend, offer_days, offer_values = [], [], [], []
+        for index, card in enumerate(cards):
+            for credit in card.get("credits") or []:
+                value = (credit.get("value") or 0) * (credit.get("weight") or 1)
+                if credit.get("currency") not in (None, "USD"):
+                    # Points credits, e.g. anniversary points, come whatever the user buys.
+                    fixed_credits[index] += dollar_value(value, credit["currency"])
+                    continue
+                categories = credit_categories(credit)
+                if not categories:
+                    fixed_credits[index] += value
+                    continue
+                grouped.append((index, groups.setdefault(categories, len(groups)), value))
+
+            for offer in card.get("offers") or []:
+                value = sum(
+                    dollar_value(amount.get("amount") or 0, amount.get("currency") or card.get("currency"))
+                    * (amount.get("weight") or 1)
+                    for amount in offer.get("amount") or []
+                )
+                value += sum(
+                    dollar_value(credit.get("value") or 0, credit.get("currency") or "USD") * (credit.get("weight") or 1)
+                    for credit in offer.get("credits") or []
+                )
+                offer_cards.append(index)
+                offer_spend.append(float(offer.get("spend") or 0))
+                offer_days.append(float(offer.get("days") or 0))
+                offer_values.append(value)
+
+        self.fixed_credits = fixed_credits
+        self.credit_groups = list(groups)
+        self.category_credits = np.zeros((len(cards), len(groups)))
+        for index, column, value in grouped:
+            self.category_credits[index, column] += value
+        self.offer_cards = np.array(offer_cards, dtype=np.intp)
+        self.offer_spend = np.array(offer_spend)
+        self.offer_days = np.array(offer_days)
+        self.offer_values = np.array(offer_values)
+
+    def simulate(self, spend_by_category, months=12):
+        """
+        Project a year's value of every card for a user's spending.
+
+        The spending is scaled to a year. Each card earns its rate on all of
+        it, its category credits up to what the user spends in those
+        categories, its other credits in full, and the best welcome offer
+        whose spend requirement the user's monthly spending reaches within
+        the offer's time limit, minus its annual fee unless that is waived.
+
+        Args:
+            spend_by_category (dict): Dollars spent per category.
+            months (int): How many months the spending covers.
+
+        Returns:
+            dict: Arrays of 'rewards', 'credits', 'bonus', 'fees' and 'net' per card.
+        """
+        import numpy as np
+
+        scale = 12 / max(months, 1)
+        annual_spend = sum(spend_by_category.values()) * scale
+        rewards = self.earn_rates * annual_spend
+
+        group_spend = np.array([
+            sum(spend_by_category.get(category, 0.0) for category in categories) * scale
+            for categories in self.credit_groups
+        ])
+        credits = self.fixed_credits + np.minimum(self.category_credits, group_spend).sum(axis=1)
+
+        # Offers without a time limit are treated as reachable within a year.
+        days = np.where(self.offer_days > 0, self.offer_days, 365.0)
+        reachable = annual_spend / 12 * days / DAYS_PER_MONTH >= self.offer_spend
+        bonus = np.zeros(len(self.cards))
+        np.maximum.at(bonus, self.offer_cards, np.where(reachable, self.offer_values, 0.0))
+
+        return {
+            "rewards": rewards,
+            "credits": credits,
+            "bonus": bonus,
+            "fees": self.fees,
+            "net": rewards + credits + bonus - self.fees,
+        }
+
+    def category_values(self, spend_by_category, months=12):
+        """
+        Value every card on each category's spending, over the months it covers.
+
+        A card earns its rate on the category's spending plus the credits
+        that apply to the category, prorated to the months and capped at the
+        spending itself. Fees and welcome offers are not tied to a category,
+        so they are left out.
+
+        Returns:
+            tuple: (list of categories, (cards x categories) array of dollars)
+        """
+        import numpy as np
+
+        categories = list(spend_by_category)
+        spend = np.array([spend_by_category[category] for category in categories], dtype=float)
+        applies = np.array([
+            [category in group for category in categories] for group in self.credit_groups
+        ], dtype=float).reshape(len(self.credit_groups), len(categories))
+        credits = self.category_credits @ applies * (months / 12)
+        return categories, np.outer(self.earn_rates, spend) + np.minimum(credits, spend)
+
+    def rank(self, spend_by_category, months=12, limit=None, owned=()):
+        """
+        Rank every card by its projected net value for a user's spending.
+
+        Args:
+            spend_by_category (dict): Dollars spent per category.
+            months (int): How many months the spending covers.
+            limit (int): How many cards to return; all of them if None.
+            owned (iterable): IDs of the user's cards, which are marked in the results.
+
+        Returns:
+            list: Dicts with the card's 'cardId', 'name', 'issuer' and 'url', whether
+            it is 'owned', and its 'rewards', 'credits', 'bonus', 'fee' and
+            'net_value' in dollars, best first.
+        """
+        import numpy as np
+
+        values = self.simulate(spend_by_category, months)
+        net = values["net"]
+        if limit is not None and limit < len(net):
+            top = np.argpartition(-net, limit)[:limit]
+            order = top[np.argsort(-net[top], kind="stable")]
+        else:
+            order = np.argsort(-net, kind="stable")
+
+        owned = set(owned)
+        results = []
+        for index in order.tolist():
+            card = self.cards[index]
+            results.append(dict(
+                card,
+                owned=card["cardId"] in owned,
+                rewards=round(float(values["rewards"][index]), 2),
+                credits=round(float(values["credits"][index]), 2),
+                bonus=round(float(values["bonus"][index]), 2),
+                fee=round(float(values["fees"][index]), 2),
+                net_value=round(float(net[index]), 2),
+            ))
+        return results
+
+
+def credit_categories(credit):
+    """The spending categories a credit can be used against, from its description."""
+    description = (credit.get("description") or "").lower()
+    categories = set()
+    for keyword, keyword_categories in CREDIT_CATEGORIES.items():
+        if keyword in description:
+            categories.update(keyword_categories)
+    return tuple(sorted(categories))
+
+
+def card_matrix(catalog):
+    """The CardMatrix for a catalog, built the first time each catalog version is used."""
+    global _matrix
+    matrix = _matrix
+    if matrix is None or matrix.version != catalog.version:
+        with _matrix_lock:
+            matrix = _matrix
+            if matrix is None or matrix.version != catalog.version:
+                matrix = _matrix = CardMatrix(catalog.cards, catalog.version)
+    return matrix
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import jwt
+from cachetools import TLRUCache
+from cryptography.x509 import load_pem_x509_certificate
+
+# Google's public certificates for Firebase ID tokens, keyed by key ID.
+CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+# A JSON file of {key ID: PEM certificate} to use instead of Google's, e.g. the
+# local key set for tests written by fake_firebase_keys.py.
+CERTS_FILE = os.getenv("FIREBASE_CERTS_FILE")
+# Used when Google's response has no max-age.
+DEFAULT_CERTS_MAX_AGE = 60 * 60
+# Tokens signed with an unknown key trigger a refetch at most this often (in seconds).
+MIN_REFETCH_INTERVAL = 60
+# How many verified tokens to remember; each is kept until it expires.
+TOKEN_CACHE_SIZE = 4096
+
+
+class InvalidIdToken(ValueError):
+    """Raised when an ID token is malformed, expired or not signed by Google for this project."""
+
+
+def max_age(cache_control):
+    """The max-age in seconds from a Cache-Control header, or None."""
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else None
+
+
+class TokenVerifier:
+    """
+    Verifies Firebase ID tokens locally, the same way firebase_admin does,
+    without a network call per login.
+
+    Google's signing certificates are cached for as long as their
+    Cache-Control header allows, in this process and (if a Database is given)
+    in the shared response cache, so one worker's fetch serves the others.
+    Verified tokens are remembered until they expire, so a burst of logins
+    with the same token is only checked once.
+    """
+
+    def __init__(self, project_id, db=None, certs_file=CERTS_FILE):
+        self.project_id = project_id
+        self.issuer = f"https://securetoken.google.com/{project_id}"
+        self.db = db
+        self.certs_file = certs_file
+        self._keys = {}
+        self._keys_expire_at = 0.0
+        self._last_fetch = 0.0
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._verified = TLRUCache(
+            maxsize=TOKEN_CACHE_SIZE,
+            ttu=lambda key, claims, now: claims["exp"],
+            timer=time.time,
+        )
+
+    def _load_certs(self, use_shared=True):
+        """Return ({key ID: PEM certificate}, expiry time), from the file, the shared cache or Google."""
+        if self.certs_file:
+            with open(self.certs_file) as f:
+                return json.load(f), float("inf")
+
+        if self.db is not None and use_shared:
+            cached = self.db.get_cached_response("firebase_certs", CERTS_URL)
+            if cached is not None:
+                cached = json.loads(cached)
+                return cached["certs"], cached["expires_at"]
+
+        import requests
+        response = requests.get(CERTS_URL, timeout=10)
+        response.raise_for_status()
+        certs = response.json()
+        expires_at = time.time() + (max_age(response.headers.get("Cache-Control")) or DEFAULT_CERTS_MAX_AGE)
+        if self.db is not None:
+            value = json.dumps({"certs": certs, "expires_at": expires_at})
+            self.db.set_cached_response("firebase_certs", CERTS_URL, None, value, expires_at)
+        return certs, expires_at
+
+    def _needs_fetch(self, key_id, now):
+        # Called with self._lock held.
+        stale = now >= self._keys_expire_at
+        unknown = key_id not in self._keys and now - self._last_fetch >= MIN_REFETCH_INTERVAL
+        return stale or unknown
+
+    def _public_key(self, key_id):
+        with self._lock:
+            if not self._needs_fetch(key_id, time.time()):
+                return self._keys.get(key_id)
+
+        # Fetch without holding self._lock, so a slow refresh does not hold up
+        # logins whose tokens are already verified. Only one thread fetches;
+        # the others wait here and then use what it loaded.
+        with self._fetch_lock:
+            with self._lock:
+                if not self._needs_fetch(key_id, time.time()):
+                    return self._keys.get(key_id)
+                # A key we have never seen means Google rotated its keys, so
+                # the copy other workers cached may be out of date too.
+                rotated = key_id not in self._keys and bool(self._keys)
+            try:
+                certs, expires_at = self._load_certs(use_shared=not rotated)
+                keys = {
+                    kid: load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+                    for kid, pem in certs.items()
+                }
+            except Exception as e:
+                raise InvalidIdToken(f"Could not load signing certificates: {e}") from e
+            with self._lock:
+                self._keys = keys
+                self._keys_expire_at = expires_at
+                self._last_fetch = time.time()
+                return keys.get(key_id)
+
+    def verify(self, id_token):
+        """
+        Verify a Firebase ID token.
+
+        Returns:
+            dict: The token's claims, with 'uid' set to the user's ID.
+
+        Raises:
+            InvalidIdToken: If the token is not valid.
+        """
+        if not isinstance(id_token, str) or not id_token:
+            raise InvalidIdToken("ID token must be a non-empty string.")
+        cache_key = hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+        with self._lock:
+            claims = self._verified.get(cache_key)
+        if claims is not None:
+            return claims
+
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except jwt.PyJWTError as e:
+            raise InvalidIdToken(str(e)) from e
+        if header.get("alg") != "RS256":
+            raise InvalidIdToken("ID token must be signed with RS256.")
+        key = self._public_key(header.get("kid"))
+        if key is None:
+            raise InvalidIdToken("ID token is signed with an unknown key.")
+
+        try:
+            claims = jwt.decode(
+                id_token,
+                key,
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=self.issuer,
+                options={"require": ["exp", "iat", "sub"]},
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidIdToken(str(e)) from e
+        if not claims["sub"] or len(claims["sub"]) > 128:
+            raise InvalidIdToken("ID token has an invalid subject.")
+        if claims.get("auth_time", 0) > time.time():
+            raise InvalidIdToken("ID token has an authentication time in the future.")
+
+        claims["uid"] = claims["sub"]
+        with self._lock:
+            self._verified[cache_key] = claims
+        return claims